@@ -0,0 +1,123 @@
+"""
+Cold-start benchmark.
+
+Measures what a serverless cold start pays before the first response, each
+run in a fresh interpreter:
+
+- import: time to `import main` (what index.py / Vercel does)
+- first /health: time from spawning `uvicorn main:app` to the first 200
+  from GET /health, including interpreter start-up and app startup events
+
+and lists the slowest top-level imports of `main` (python -X importtime).
+Uses a throwaway SQLite database. Run from the backend directory:
+
+    python -m benchmarks.cold_start --runs 5
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import statistics
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+def _env() -> dict:
+    env = dict(os.environ)
+    db_dir = tempfile.mkdtemp(prefix="readwise-bench-")
+    # Never fall through to a DATABASE_URL from the shell or .env
+    env["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", f"sqlite:///{os.path.join(db_dir, 'bench.db')}")
+    env["LOG_LEVEL"] = "WARNING"
+    # The cold-start setting: /health does not wait for schema creation
+    env.setdefault("INIT_DB_ON_STARTUP", "background")
+    return env
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_import() -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+def measure_first_health(timeout: float = 60.0) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+        raise TimeoutError("server did not answer /health")
+    finally:
+        server.terminate()
+        server.wait()
+
+def slowest_imports(count: int):
+    """Top-level modules imported by `import main`, by cumulative import time."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Direct imports of main are indented by two spaces
+        if cumulative.strip().isdigit() and name.startswith("   ") and not name.startswith("    "):
+            modules.append((name.strip(), int(cumulative) / 1000))
+    return sorted(modules, key=lambda item: item[1], reverse=True)[:count]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ReadWise cold-start benchmark")
+    arg_parser.add_argument("--runs", type=int, default=5)
+    arg_parser.add_argument("--top", type=int, default=8, help="Slowest imports to list")
+    arg_parser.add_argument("--json", action="store_true")
+    args = arg_parser.parse_args()
+
+    measure_import()  # warm the bytecode and OS file caches
+    imports = [measure_import() * 1000 for _ in range(args.runs)]
+    first_health = [measure_first_health() * 1000 for _ in range(args.runs)]
+
+    result = {
+        "runs": args.runs,
+        "import_main_p50_ms": round(statistics.median(imports), 1),
+        "import_main_max_ms": round(max(imports), 1),
+        "first_health_p50_ms": round(statistics.median(first_health), 1),
+        "first_health_max_ms": round(max(first_health), 1),
+        "slowest_imports_ms": {name: round(ms, 1) for name, ms in slowest_imports(args.top)},
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            if isinstance(value, dict):
+                print(f"{key:>20}:")
+                for name, ms in value.items():
+                    print(f"{'':>22}{name:<28} {ms}")
+            else:
+                print(f"{key:>20}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Per-book memory benchmark.
+
+Uploads generated PDFs of increasing size through POST /books (mock AI
+backend, throwaway SQLite database) and reports, with tracemalloc, the peak
+Python heap of:
+
+- upload: the request handler (reading, parsing and storing the upload)
+- held: what the upload leaves alive while the book is processed (this
+  includes the test client's own copy of the request body)
+- processing: the background task (AI analysis, indexing, overview)
+
+Processing memory should stay flat as books grow; upload memory grows with
+the size of the file. Each size runs in a fresh subprocess. Run from the
+backend directory:
+
+    python -m benchmarks.memory --sizes 10x20,20x50,40x50
+"""
+import os
+import sys
+import json
+import uuid
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+from benchmarks.pipeline import BACKEND_DIR, JWT_SECRET, _peak_rss_mb
+
+def run_size(chapters: int, pages_per_chapter: int) -> dict:
+    """Upload one book in the current process and return its memory measurements."""
+    db_dir = tempfile.mkdtemp(prefix="readwise-bench-")
+    # Never fall through to a DATABASE_URL from the shell or .env
+    os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", f"sqlite:///{os.path.join(db_dir, 'bench.db')}")
+    os.environ["AI_BACKEND"] = "mock"
+    os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+
+    import jwt
+    from fastapi.testclient import TestClient
+    from generate_pdf import generate_book_pdf
+    from services.database import init_db
+    import main
+
+    init_db()
+    main.limiter.enabled = False
+    pdf_bytes = generate_book_pdf(chapters, pages_per_chapter)
+
+    peaks = {}
+    process_book_background = main.process_book_background
+
+    def measured_background(*args, **kwargs):
+        # The upload handler has returned by now: its peak is the peak so far
+        current, peaks["upload"] = tracemalloc.get_traced_memory()
+        peaks["held"] = current
+        tracemalloc.reset_peak()
+        process_book_background(*args, **kwargs)
+        peaks["processing"] = tracemalloc.get_traced_memory()[1] - current
+
+    main.process_book_background = measured_background
+
+    token = jwt.encode({"sub": str(uuid.uuid4())}, JWT_SECRET, algorithm="HS256")
+    client = TestClient(main.app)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    response = client.post(
+        "/books",
+        files={"file": ("bench.pdf", pdf_bytes, "application/pdf")},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    tracemalloc.stop()
+    response.raise_for_status()
+    book = main.store.get_book(response.json()["id"])
+
+    return {
+        "chapters": chapters,
+        "pages": chapters * pages_per_chapter,
+        "pdf_kb": round(len(pdf_bytes) / 1024, 1),
+        "status": book["status"],
+        "upload_peak_mb": round((peaks["upload"] - base) / 2**20, 1),
+        "held_mb": round((peaks["held"] - base) / 2**20, 1),
+        "processing_peak_mb": round(peaks["processing"] / 2**20, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ReadWise per-book memory benchmark")
+    arg_parser.add_argument("--sizes", default="10x20,20x50,40x50",
+                            help="Comma-separated CHAPTERSxPAGES_PER_CHAPTER book sizes")
+    arg_parser.add_argument("--json", action="store_true")
+    arg_parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.run:
+        chapters, pages = (int(n) for n in args.run.split("x"))
+        print(json.dumps(run_size(chapters, pages)))
+        return
+
+    env = dict(os.environ, MOCK_AI_LATENCY_MS="0", LOG_LEVEL="WARNING")
+    results = []
+    for size in args.sizes.split(","):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.memory", "--run", size],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    columns = list(results[0])
+    print("  ".join(f"{c:>18}" for c in columns))
+    for result in results:
+        print("  ".join(f"{result[c]!s:>18}" for c in columns))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+End-to-end throughput benchmark for the upload pipeline.
+
+Generates text PDFs, uploads them through POST /books (upload_book) with the
+mock AI backend and a throwaway SQLite database, and reports per scenario:
+parse time, time-to-completed, DB writes and peak RSS.
+
+Each scenario runs in a fresh subprocess so peak RSS is not polluted by the
+previous one. Run from the backend directory:
+
+    python -m benchmarks.pipeline --sizes 5x4,20x10,50x20 --concurrency 1,4
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import resource
+import tempfile
+import subprocess
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JWT_SECRET = "benchmark-secret-with-at-least-32-characters"
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run_scenario(chapters: int, pages_per_chapter: int, concurrency: int, outline: bool = False) -> dict:
+    """Run a single scenario in the current process and return its measurements."""
+    db_dir = tempfile.mkdtemp(prefix="readwise-bench-")
+    # Never fall through to a DATABASE_URL from the shell or .env
+    os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", f"sqlite:///{os.path.join(db_dir, 'bench.db')}")
+    os.environ["AI_BACKEND"] = "mock"
+    os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+
+    import jwt
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+    from generate_pdf import generate_book_pdf
+    from services import parser
+    from services.database import engine, init_db
+    import main
+
+    init_db()
+    main.limiter.enabled = False
+
+    db_writes = {"count": 0}
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _count_writes(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(" ", 1)[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            db_writes["count"] += 1
+
+    pdf_bytes = generate_book_pdf(chapters, pages_per_chapter, outline=outline)
+
+    parse_start = time.perf_counter()
+    parsed = parser.parse_book_to_chapters(pdf_bytes, "bench.pdf")
+    parse_seconds = time.perf_counter() - parse_start
+
+    owner_id = str(uuid.uuid4())
+    token = jwt.encode({"sub": owner_id}, JWT_SECRET, algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+    client = TestClient(main.app)
+
+    def upload(n: int) -> float:
+        start = time.perf_counter()
+        response = client.post(
+            "/books",
+            files={"file": (f"bench-{n}.pdf", pdf_bytes, "application/pdf")},
+            headers=headers,
+        )
+        response.raise_for_status()
+        book_id = response.json()["id"]
+        # TestClient runs background tasks before returning; poll anyway so the
+        # measurement stays valid if processing moves off the request.
+        while main.store.get_book(book_id)["status"] == "processing":
+            time.sleep(0.01)
+        if main.store.get_book(book_id)["status"] != "completed":
+            raise RuntimeError(f"Book {book_id} did not complete")
+        return time.perf_counter() - start
+
+    writes_before = db_writes["count"]
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        completed = list(pool.map(upload, range(concurrency)))
+    wall_seconds = time.perf_counter() - wall_start
+
+    return {
+        "chapters": chapters,
+        "pages": chapters * pages_per_chapter,
+        "pdf_kb": round(len(pdf_bytes) / 1024, 1),
+        "detected_chapters": len(parsed),
+        "concurrency": concurrency,
+        "parse_s": round(parse_seconds, 3),
+        "completed_p50_s": round(statistics.median(completed), 3),
+        "completed_max_s": round(max(completed), 3),
+        "books_per_min": round(concurrency / wall_seconds * 60, 1),
+        "db_writes_per_book": round((db_writes["count"] - writes_before) / concurrency, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+def _parse_sizes(value: str):
+    sizes = []
+    for item in value.split(","):
+        chapters, pages = item.lower().split("x")
+        sizes.append((int(chapters), int(pages)))
+    return sizes
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ReadWise pipeline benchmark")
+    arg_parser.add_argument("--sizes", default="5x4,20x10,50x20",
+                            help="Comma separated CHAPTERSxPAGES_PER_CHAPTER book sizes")
+    arg_parser.add_argument("--concurrency", default="1,4",
+                            help="Comma separated numbers of concurrent uploads")
+    arg_parser.add_argument("--latency-ms", default="20", help="Mock AI latency per call")
+    arg_parser.add_argument("--error-rate", default="0", help="Mock AI error rate")
+    arg_parser.add_argument("--outline", action="store_true", help="Give generated PDFs a bookmark per chapter")
+    arg_parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    arg_parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.scenario:
+        chapters, pages, concurrency = (int(v) for v in args.scenario.split(":"))
+        print(json.dumps(run_scenario(chapters, pages, concurrency, outline=args.outline)))
+        return
+
+    env = dict(os.environ, MOCK_AI_LATENCY_MS=args.latency_ms, MOCK_AI_ERROR_RATE=args.error_rate)
+    results = []
+    for chapters, pages in _parse_sizes(args.sizes):
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            command = [sys.executable, "-m", "benchmarks.pipeline", "--scenario", f"{chapters}:{pages}:{concurrency}"]
+            if args.outline:
+                command.append("--outline")
+            output = subprocess.run(
+                command,
+                cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            if args.json:
+                print(json.dumps(result))
+
+    if not args.json:
+        columns = list(results[0].keys()) if results else []
+        print("  ".join(columns))
+        for result in results:
+            print("  ".join(f"{str(result[c]):>{len(c)}}" for c in columns))
+
+if __name__ == "__main__":
+    main()
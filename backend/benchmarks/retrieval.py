@@ -0,0 +1,78 @@
+"""
+Vector retrieval benchmark.
+
+Builds a VectorIndex over synthetic clustered unit vectors and reports query
+latency (p50/p95) of exact brute-force search and of the IVF index, plus the
+IVF recall@k against the exact results. Runs in memory; no database needed.
+
+    python -m benchmarks.retrieval --vectors 200000 --dim 384 --queries 200
+"""
+import json
+import time
+import argparse
+import statistics
+import numpy as np
+from services.retrieval import IVF_PROBES, VectorIndex
+
+def _clustered_vectors(rng: np.random.Generator, count: int, dim: int, clusters: int = 500) -> np.ndarray:
+    # Topics as random directions, passages as noisy copies of a topic
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _latencies(index: VectorIndex, queries: np.ndarray, k: int):
+    results, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append({chunk_id for chunk_id, _ in index.search(query, k)})
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return results, timings
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ReadWise vector retrieval benchmark")
+    arg_parser.add_argument("--vectors", type=int, default=200000)
+    arg_parser.add_argument("--dim", type=int, default=384)
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--k", type=int, default=10)
+    arg_parser.add_argument("--probes", type=int, default=IVF_PROBES)
+    arg_parser.add_argument("--json", action="store_true")
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vectors = _clustered_vectors(rng, args.vectors, args.dim)
+    queries = _clustered_vectors(rng, args.queries, args.dim)
+    ids = [str(i) for i in range(args.vectors)]
+
+    exact = VectorIndex(args.dim, ivf_min_vectors=args.vectors + 1)
+    exact.add(ids, vectors)
+
+    build_start = time.perf_counter()
+    ivf = VectorIndex(args.dim, ivf_min_vectors=0, probes=args.probes)
+    ivf.add(ids, vectors)
+    build_seconds = time.perf_counter() - build_start
+
+    exact_results, exact_timings = _latencies(exact, queries, args.k)
+    ivf_results, ivf_timings = _latencies(ivf, queries, args.k)
+    recall = statistics.mean(len(a & b) / args.k for a, b in zip(exact_results, ivf_results))
+
+    result = {
+        "vectors": args.vectors,
+        "dim": args.dim,
+        "k": args.k,
+        "probes": args.probes,
+        "exact_p50_ms": round(statistics.median(exact_timings), 2),
+        "exact_p95_ms": round(exact_timings[int(len(exact_timings) * 0.95) - 1], 2),
+        "ivf_build_s": round(build_seconds, 1),
+        "ivf_p50_ms": round(statistics.median(ivf_timings), 2),
+        "ivf_p95_ms": round(ivf_timings[int(len(ivf_timings) * 0.95) - 1], 2),
+        "ivf_recall": round(recall, 3),
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>14}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Search latency benchmark.
+
+Seeds one user's library with synthetic chapters and reports p50/p95/max
+latency of search_chapters() for random one- and two-word queries. Uses a
+throwaway SQLite database (FTS5) unless BENCH_DATABASE_URL points at Postgres.
+
+    python -m benchmarks.search --chapters 100000 --words 300 --queries 200
+"""
+import os
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import statistics
+
+VOCABULARY_SIZE = 20000
+
+def _vocabulary(rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(VOCABULARY_SIZE)]
+
+def _zipf_words(rng: random.Random, vocabulary, count: int):
+    # Skewed word frequencies, like natural text
+    return [vocabulary[min(int(rng.paretovariate(1.1)) - 1, len(vocabulary) - 1)] for _ in range(count)]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ReadWise search benchmark")
+    arg_parser.add_argument("--chapters", type=int, default=100000)
+    arg_parser.add_argument("--chapters-per-book", type=int, default=25)
+    arg_parser.add_argument("--words", type=int, default=300, help="Words of text per chapter")
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--json", action="store_true")
+    args = arg_parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="readwise-bench-")
+    os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", f"sqlite:///{os.path.join(db_dir, 'bench.db')}")
+
+    from services.database import engine, init_db
+    from services.models import Book, Chapter
+    from services import search
+
+    init_db()
+    rng = random.Random(42)
+    vocabulary = _vocabulary(rng)
+    owner_id = uuid.uuid4()
+
+    seed_start = time.perf_counter()
+    with engine.begin() as conn:
+        book_id = None
+        batch = []
+        for n in range(args.chapters):
+            if n % args.chapters_per_book == 0:
+                book_id = str(uuid.uuid4())
+                conn.execute(Book.__table__.insert(), {
+                    "id": book_id, "title": f"Book {n // args.chapters_per_book}",
+                    "status": "completed", "owner_id": owner_id
+                })
+            index = n % args.chapters_per_book
+            batch.append({
+                "id": f"{book_id}_chapter_{index}",
+                "book_id": book_id,
+                "owner_id": owner_id,
+                "chapter_index": index,
+                "title": " ".join(_zipf_words(rng, vocabulary, 4)).title(),
+                "text": " ".join(_zipf_words(rng, vocabulary, args.words)),
+                "summary": " ".join(_zipf_words(rng, vocabulary, 40)),
+                "key_points": [" ".join(_zipf_words(rng, vocabulary, 8)) for _ in range(3)],
+            })
+            if len(batch) == 1000:
+                conn.execute(Chapter.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(Chapter.__table__.insert(), batch)
+    seed_seconds = time.perf_counter() - seed_start
+
+    # Mix of common and rare terms, one or two words per query
+    queries = [
+        " ".join(_zipf_words(rng, vocabulary, rng.randint(1, 2)))
+        if i % 2 else vocabulary[rng.randint(0, 2000)]
+        for i in range(args.queries)
+    ]
+    search.search_chapters(owner_id, queries[0])  # warm up
+
+    timings = []
+    hits = 0
+    for query in queries:
+        start = time.perf_counter()
+        found = search.search_chapters(owner_id, query, limit=20)
+        timings.append((time.perf_counter() - start) * 1000)
+        hits += bool(found["results"])
+
+    timings.sort()
+    result = {
+        "chapters": args.chapters,
+        "seed_s": round(seed_seconds, 1),
+        "queries": len(queries),
+        "queries_with_hits": hits,
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 2),
+        "max_ms": round(timings[-1], 2),
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>18}: {value}")
+
+if __name__ == "__main__":
+    main()
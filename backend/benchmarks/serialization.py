@@ -0,0 +1,193 @@
+"""
+Response serialization benchmark.
+
+Seeds a throwaway SQLite database with analyzed books, serves the app with
+uvicorn in a subprocess (rate limits off) and reports throughput, p50 latency
+and response size of the read endpoints, requested by concurrent keep-alive
+clients with and without compression:
+
+- book: GET /books/{book_id}
+- books: GET /books
+- chapters: GET /books/{book_id}/chapters
+- chapter: GET /books/{book_id}/chapters/{chapter_index} (full text)
+
+Run from the backend directory:
+
+    python -m benchmarks.serialization --books 20 --chapters 40 --chapter-kb 60
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+import http.client
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = "story principle theory reading attention memory habit practice focus insight chapter idea system".split()
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def serve(port: int, books: int, chapters: int, chapter_kb: int):
+    """Seed the database and run the app until killed (subprocess side)."""
+    db_dir = tempfile.mkdtemp(prefix="readwise-bench-")
+    # Never fall through to a DATABASE_URL from the shell or .env
+    os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", f"sqlite:///{os.path.join(db_dir, 'bench.db')}")
+    os.environ["AI_BACKEND"] = "mock"
+
+    import uuid
+    import uvicorn
+    from services.database import init_db
+    import main
+
+    from services.auth import get_current_user_id
+
+    init_db()
+    main.limiter.enabled = False
+    rng = random.Random(0)
+    owner_id = str(uuid.uuid4())
+    # Chapter reads require a user; read as the owner of every seeded book
+    main.app.dependency_overrides[get_current_user_id] = lambda: owner_id
+    book_ids = []
+    for _ in range(books):
+        book_id = str(uuid.uuid4())
+        main.store.create_book({
+            "id": book_id, "title": "bench.pdf", "status": "completed", "owner_id": owner_id,
+            "chapter_count": chapters, "overview_summary": " ".join(rng.choices(WORDS, k=200)),
+            "overview_key_points": [" ".join(rng.choices(WORDS, k=12)) for _ in range(5)],
+            "overview_questions": [" ".join(rng.choices(WORDS, k=12)) + "?" for _ in range(5)]
+        })
+        words = chapter_kb * 1024 // 8
+        main.store.create_chapters(book_id, owner_id, [
+            {"index": i, "title": f"Chapter {i + 1}", "text": " ".join(rng.choices(WORDS, k=words))}
+            for i in range(chapters)
+        ])
+        for i in range(chapters):
+            main.store.save_chapter_analysis(f"{book_id}_chapter_{i}", {
+                "summary": " ".join(rng.choices(WORDS, k=120)),
+                "key_points": [" ".join(rng.choices(WORDS, k=12)) for _ in range(5)],
+                "questions": [" ".join(rng.choices(WORDS, k=12)) + "?" for _ in range(5)]
+            })
+        book_ids.append(book_id)
+
+    print(json.dumps({"book_id": book_ids[0]}), flush=True)
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+def _wait_ready(port: int, timeout: float = 120.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError("server did not answer /health")
+
+def measure(port: int, paths, encoding: str, clients: int, seconds: float) -> dict:
+    latencies, sizes = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(offset: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        mine_latencies, mine_sizes = [], []
+        n = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            conn.request("GET", paths[n % len(paths)], headers={"Accept-Encoding": encoding})
+            response = conn.getresponse()
+            body = response.read()
+            if response.status != 200:
+                raise RuntimeError(f"{paths[n % len(paths)]}: HTTP {response.status}")
+            mine_latencies.append(time.perf_counter() - start)
+            mine_sizes.append(len(body))
+            n += 1
+        conn.close()
+        with lock:
+            latencies.extend(mine_latencies)
+            sizes.extend(mine_sizes)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "response_kb": round(statistics.mean(sizes) / 1024, 1),
+    }
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ReadWise response serialization benchmark")
+    arg_parser.add_argument("--books", type=int, default=20)
+    arg_parser.add_argument("--chapters", type=int, default=40, help="Chapters per book")
+    arg_parser.add_argument("--chapter-kb", type=int, default=60, help="Text per chapter")
+    arg_parser.add_argument("--clients", type=int, default=8)
+    arg_parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each measurement")
+    arg_parser.add_argument("--encodings", default="identity,gzip",
+                            help="Comma-separated Accept-Encoding values to measure")
+    arg_parser.add_argument("--json", action="store_true")
+    arg_parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.books, args.chapters, args.chapter_kb)
+        return
+
+    port = _free_port()
+    env = dict(os.environ, LOG_LEVEL="WARNING", INIT_DB_ON_STARTUP="false")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.serialization", "--serve", str(port), "--books", str(args.books),
+         "--chapters", str(args.chapters), "--chapter-kb", str(args.chapter_kb)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        # The app's JSON logs share stdout
+        book_id = None
+        for line in server.stdout:
+            if line.startswith('{"book_id"'):
+                book_id = json.loads(line)["book_id"]
+                break
+        if book_id is None:
+            raise RuntimeError("benchmark server exited while seeding")
+        _wait_ready(port)
+        endpoints = {
+            "book": [f"/books/{book_id}"],
+            "books": ["/books"],
+            "chapters": [f"/books/{book_id}/chapters"],
+            "chapter": [f"/books/{book_id}/chapters/{i}" for i in range(args.chapters)],
+        }
+        results = []
+        for name, paths in endpoints.items():
+            for encoding in args.encodings.split(","):
+                measure(port, paths, encoding, args.clients, min(1.0, args.seconds))  # warm-up
+                result = measure(port, paths, encoding, args.clients, args.seconds)
+                results.append({"endpoint": name, "encoding": encoding, **result})
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    columns = list(results[0])
+    print("  ".join(f"{c:>15}" for c in columns))
+    for result in results:
+        print("  ".join(f"{result[c]!s:>15}" for c in columns))
+
+if __name__ == "__main__":
+    main()
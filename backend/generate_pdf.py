@@ -1,14 +1,86 @@
+import argparse
 from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
 from io import BytesIO
 
+WORDS = (
+    "reading attention memory habit practice focus insight chapter idea system "
+    "learning recall question summary argument evidence story principle theory"
+).split()
+
 # Create a PDF file with a blank page
 def create_pdf():
     writer = PdfWriter()
     writer.add_blank_page(width=72, height=72)
-    
+
     with open("test.pdf", "wb") as f:
         writer.write(f)
     print("Created test.pdf")
 
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _page_stream(lines) -> DecodedStreamObject:
+    ops = ["BT", "/F1 11 Tf", "14 TL", "72 740 Td"]
+    for line in lines:
+        ops.append(f"({_escape(line)}) Tj T*")
+    ops.append("ET")
+    stream = DecodedStreamObject()
+    stream.set_data("\n".join(ops).encode("latin-1"))
+    return stream
+
+def generate_book_pdf(chapters: int = 10, pages_per_chapter: int = 5, lines_per_page: int = 45,
+                      outline: bool = False) -> bytes:
+    """
+    Generate a text PDF with `chapters` chapters of `pages_per_chapter` pages each.
+    Every chapter starts with a "Chapter N: ..." heading so the parser can split it,
+    and with outline=True also gets a bookmark pointing at its first page.
+    The output is deterministic for the same arguments.
+    """
+    writer = PdfWriter()
+    resources = DictionaryObject({
+        NameObject("/Font"): DictionaryObject({
+            NameObject("/F1"): DictionaryObject({
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            })
+        })
+    })
+
+    word_index = 0
+    for chapter in range(1, chapters + 1):
+        for page_number in range(pages_per_chapter):
+            lines = []
+            if page_number == 0:
+                lines.append(f"Chapter {chapter}: The Practice of Reading Part {chapter}")
+                lines.append("")
+            while len(lines) < lines_per_page:
+                words = [WORDS[(word_index + i) % len(WORDS)] for i in range(12)]
+                word_index += 7
+                lines.append(" ".join(words).capitalize() + ".")
+            page = writer.add_blank_page(width=612, height=792)
+            page[NameObject("/Resources")] = resources
+            page.replace_contents(_page_stream(lines))
+            if outline and page_number == 0:
+                writer.add_outline_item(f"Chapter {chapter}: The Practice of Reading Part {chapter}",
+                                        len(writer.pages) - 1)
+
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
 if __name__ == "__main__":
-    create_pdf()
+    arg_parser = argparse.ArgumentParser(description="Generate test PDFs")
+    arg_parser.add_argument("--chapters", type=int, default=0, help="Generate a text book with this many chapters")
+    arg_parser.add_argument("--pages-per-chapter", type=int, default=5)
+    arg_parser.add_argument("--outline", action="store_true", help="Add a bookmark per chapter")
+    arg_parser.add_argument("--output", default="test.pdf")
+    args = arg_parser.parse_args()
+
+    if args.chapters:
+        with open(args.output, "wb") as f:
+            f.write(generate_book_pdf(args.chapters, args.pages_per_chapter, outline=args.outline))
+        print(f"Created {args.output} ({args.chapters} chapters x {args.pages_per_chapter} pages)")
+    else:
+        create_pdf()
@@ -1,19 +1,46 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Depends, Request
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Type
+import os
+import asyncio
+import orjson
 import uuid
 import time
-from dotenv import load_dotenv
+import logging
+import functools
+import tempfile
+import threading
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from services import store, parser, ai
-from services.database import init_db
+from services import parser, ai, metrics, tracing, scheduler, singleflight, LazyModule
 from services.auth import get_current_user_id
+from services.log import configure_logging, correlation
 
-load_dotenv()
+# SQLAlchemy and NumPy load on first use, so a cold start can answer /health without them
+store = LazyModule("services.store")
+search = LazyModule("services.search")
+retrieval = LazyModule("services.retrieval")
+
+configure_logging()
+tracing.configure_tracing()
+
+logger = logging.getLogger(__name__)
+
+# Create missing tables on startup:
+# - true (default): before the first request is served
+# - background: /health and /metrics are served at once, other requests wait until it is done
+# - false: skipped; serverless deployments create the schema once at deploy time
+INIT_DB_ON_STARTUP = os.getenv("INIT_DB_ON_STARTUP", "true").lower()
+# Paths that never touch the database, so they need not wait for the schema
+SCHEMA_FREE_PATHS = {"/health", "/metrics"}
 
 # Initialize rate limiter
 limiter = Limiter(key_func=get_remote_address)
@@ -29,6 +56,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses of at least COMPRESSION_MIN_BYTES (chapter text compresses about 3x).
+# Brotli when brotli-asgi is installed, for clients that accept it; gzip otherwise
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_BYTES, quality=4, gzip_fallback=True)
+except ImportError:
+    # Level 4 compresses a 60 KB chapter in about 1 ms; the default 9 takes ~9x as long
+    # for a few percent smaller output (benchmarks/serialization.py)
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_BYTES, compresslevel=4)
+
 # Custom rate limit error handler
 @app.exception_handler(RateLimitExceeded)
 async def custom_rate_limit_handler(request: Request, exc: RateLimitExceeded):
@@ -40,10 +78,51 @@ async def custom_rate_limit_handler(request: Request, exc: RateLimitExceeded):
         }
     )
 
-@app.on_event("startup")
-def on_startup():
+_schema_ready = asyncio.Event()
+if INIT_DB_ON_STARTUP != "background":
+    # Nothing to wait for: the schema exists before serving (or is managed outside the app),
+    # so apps driven without startup events (TestClient without `with`) are never held
+    _schema_ready.set()
+
+class SchemaReadyMiddleware:
+    """Holds requests until startup schema creation has finished."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not _schema_ready.is_set() and scope["type"] == "http" and scope["path"] not in SCHEMA_FREE_PATHS:
+            await _schema_ready.wait()
+        await self.app(scope, receive, send)
+
+if INIT_DB_ON_STARTUP == "background":
+    app.add_middleware(SchemaReadyMiddleware)
+
+def _init_db():
+    from services.database import init_db
     init_db()
 
+async def _init_db_in_background():
+    try:
+        await run_in_threadpool(_init_db)
+    except Exception as e:
+        logger.exception("Database initialization failed: %s", e)
+    finally:
+        # Requests go on to fail (and be logged) individually rather than hang
+        _schema_ready.set()
+
+@app.on_event("startup")
+async def on_startup():
+    if INIT_DB_ON_STARTUP == "background":
+        app.state.init_db_task = asyncio.create_task(_init_db_in_background())
+        return
+    if INIT_DB_ON_STARTUP == "true":
+        await run_in_threadpool(_init_db)
+
+@app.on_event("shutdown")
+def on_shutdown():
+    tracing.shutdown_tracing()
+
 # Pydantic models
 class Book(BaseModel):
     id: str
@@ -73,70 +152,375 @@ class ChapterDetail(BaseModel):
     key_points: Optional[List[str]] = None
     questions: Optional[List[str]] = None
 
+class ChapterUsage(BaseModel):
+    chapter_index: int
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: Optional[int] = None
+
+class BookUsage(BaseModel):
+    book_id: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    chapters: List[ChapterUsage] = []
+
+class UserUsage(BaseModel):
+    owner_id: str
+    book_count: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    reserved_tokens: int = 0
+    window_days: int
+    token_budget: Optional[int] = None
+    remaining_tokens: Optional[int] = None
+
+class SearchHit(BaseModel):
+    book_id: str
+    book_title: str
+    chapter_index: int
+    title: str
+    rank: float
+    snippet: Optional[str] = None
+
+class SearchResults(BaseModel):
+    query: str
+    limit: int
+    offset: int
+    has_more: bool
+    results: List[SearchHit]
+
+class RetrievalHit(BaseModel):
+    book_id: str
+    book_title: str
+    chapter_index: int
+    chapter_title: str
+    chunk_index: int
+    text: str
+    score: float
+
+class RetrievalResults(BaseModel):
+    query: str
+    k: int
+    results: List[RetrievalHit]
+
+class BatchBook(BaseModel):
+    id: str
+    title: str
+    status: str
+    chapter_count: int
+    analyzed_chapters: int
+
+class BatchStatus(BaseModel):
+    id: str
+    status: str  # processing, completed (some books may have failed), error (all failed)
+    book_count: int
+    completed: int
+    failed: int
+    processing: int
+    chapter_count: int
+    analyzed_chapters: int
+    progress: float
+    created_at: Optional[str] = None
+    books: List[BatchBook]
+
+def _store_response(model: Type[BaseModel], content) -> Response:
+    """
+    Serialize store output (a dict or a list of dicts) for an endpoint declaring
+    `model` as its response model. The store already returns the model's types, so
+    instead of validating every field again only the model's fields are kept.
+    """
+    fields = list(model.model_fields)
+    if isinstance(content, list):
+        body = [{field: item[field] for field in fields} for item in content]
+    else:
+        body = {field: content[field] for field in fields}
+    return Response(content=orjson.dumps(body), media_type="application/json")
+
+# Per-user token budget over a rolling window; 0 disables the check
+USER_TOKEN_BUDGET = int(os.getenv("USER_TOKEN_BUDGET", "0"))
+USER_TOKEN_BUDGET_WINDOW_DAYS = int(os.getenv("USER_TOKEN_BUDGET_WINDOW_DAYS", "30"))
+
+# Same setting as search.SEARCH_CANDIDATE_LIMIT, read here so the search module loads lazily
+SEARCH_CANDIDATE_LIMIT = int(os.getenv("SEARCH_CANDIDATE_LIMIT", "500"))
+
+# Files accepted by one POST /batches request
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "50"))
+
+# Chapters analyzed while a book is processed; later ones are analyzed when first read
+# (GET /books/{book_id}/chapters/{chapter_index}). Negative analyzes every chapter up front
+EAGER_CHAPTERS = int(os.getenv("EAGER_CHAPTERS", "-1"))
+
+# The book overview gets the whole text up to this many characters (about 100k tokens,
+# within the model's context); longer books are summarized from their chapter summaries
+OVERVIEW_MAX_CHARS = int(os.getenv("OVERVIEW_MAX_CHARS", "400000"))
+
+def _user_usage(user_id: str) -> dict:
+    since = datetime.now(timezone.utc) - timedelta(days=USER_TOKEN_BUDGET_WINDOW_DAYS)
+    usage = store.get_owner_usage(user_id, since=since)
+    usage["window_days"] = USER_TOKEN_BUDGET_WINDOW_DAYS
+    if USER_TOKEN_BUDGET:
+        usage["token_budget"] = USER_TOKEN_BUDGET
+        usage["remaining_tokens"] = max(0, USER_TOKEN_BUDGET - usage["total_tokens"] - usage["reserved_tokens"])
+    return usage
+
+# Held from a budget check until the checked book's reservation is stored, so uploads
+# handled by this process cannot all pass the check before any of them reserves
+_budget_lock = threading.Lock()
+
+def _check_token_budget(user_id: str, estimated_tokens: int = 0):
+    """
+    Reject the upload if it would take the user over their token budget. Tokens reserved
+    by books still being processed count as used; callers reserve estimated_tokens on the
+    book (reserved_tokens) while holding _budget_lock.
+    """
+    if not USER_TOKEN_BUDGET:
+        return
+    usage = _user_usage(user_id)
+    used = usage["total_tokens"] + usage["reserved_tokens"]
+    if used + estimated_tokens > USER_TOKEN_BUDGET:
+        metrics.ERRORS.labels("token_budget").inc()
+        detail = (f"Token budget exceeded: {used} of {USER_TOKEN_BUDGET} tokens used or reserved in the last "
+                  f"{USER_TOKEN_BUDGET_WINDOW_DAYS} days")
+        if estimated_tokens:
+            detail += f", this book needs about {estimated_tokens}"
+        raise HTTPException(status_code=429, detail=detail)
+
+def _create_book_within_budget(book_data: dict) -> dict:
+    """
+    Check the owner's budget for the book's reserved_tokens and create it with that
+    reservation. Blocks on _budget_lock and the database, so call it from a thread.
+    """
+    with _budget_lock:
+        _check_token_budget(book_data["owner_id"], estimated_tokens=book_data["reserved_tokens"])
+        return store.create_book(book_data)
+
+def _is_eager(position: int) -> bool:
+    return EAGER_CHAPTERS < 0 or position < EAGER_CHAPTERS
+
+def _estimate_book_tokens(chapters_data: list) -> int:
+    # Every eagerly analyzed chapter is sent once on its own; the overview sends the whole
+    # text again, up to OVERVIEW_MAX_CHARS (beyond that it is built from much shorter digests).
+    # Chapters left for their readers are checked against the budget when they are read
+    book_tokens = sum(ai.estimate_tokens(ch["text"]) for ch in chapters_data)
+    chapter_tokens = sum(
+        ai.estimate_tokens(ch["text"]) for position, ch in enumerate(chapters_data) if _is_eager(position)
+    )
+    return chapter_tokens + min(book_tokens, OVERVIEW_MAX_CHARS // 4)  # ai.estimate_tokens ratio
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+class _BookRun:
+    """Running totals of one book's processing, shared by its chapter steps (which may run on several threads)."""
+
+    def __init__(self, book_id: str, book_title: str, owner_id: Optional[str]):
+        self.book_id = book_id
+        self.book_title = book_title
+        self.owner_id = owner_id
+        self.indexing = []
+        self.failed = False
+        self.started_at = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.started_at is not None:
+                return
+            self.started_at = time.perf_counter()
+        metrics.QUEUE_DEPTH.dec()
+        metrics.IN_FLIGHT_BOOKS.inc()
+
+    def stop(self):
+        metrics.IN_FLIGHT_BOOKS.dec()
+        metrics.STAGE_SECONDS.labels("book_processing").observe(time.perf_counter() - self.started_at)
+
+# Background processing and readers analyze chapters through this, so a chapter
+# being analyzed (or read by several people at once) costs a single LLM call
+_chapter_flights = singleflight.SingleFlight()
+
+def _analyze_stored_chapter(chapter_id: str, book_id: str):
+    """
+    Analyze a stored chapter unless it already has a summary, save the results and
+    add its token usage to the book. Returns (chapter dict, shared), where shared
+    means the call joined an analysis already in flight. If the analysis fails the
+    chapter is returned (and left) without a summary, so its next read retries it.
+    """
+    def analyze():
+        # Checked inside the flight: the previous one may have finished just before
+        chapter = store.get_chapter(chapter_id)
+        if chapter is None or chapter["summary"] is not None:
+            return chapter
+        
+        # Process chapter with AI
+        chapter_result = ai.process_chapter(chapter["text"], chapter["title"])
+        usage = chapter_result.get("usage", {})
+        if chapter_result.get("error"):
+            # A failed call may still have used tokens (e.g. unparseable output)
+            store.add_book_usage(book_id, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+            return chapter
+        analysis = {
+            "summary": chapter_result.get("summary"),
+            "key_points": chapter_result.get("key_points", []),
+            "questions": chapter_result.get("questions", [])
+        }
+        
+        # Store chapter results in database
+        store.save_chapter_analysis(chapter_id, {
+            **analysis,
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "llm_latency_ms": usage.get("latency_ms")
+        }, book_id=book_id)
+        return {**chapter, **analysis}
+    
+    return _chapter_flights.do(chapter_id, analyze)
+
+def _index_chapter(run: _BookRun, chapter_id: str):
+    # Embed the chapter while the next one is analyzed
+    future = retrieval.index_chapter_async(chapter_id, run.book_id, run.owner_id)
+    with run.lock:
+        run.indexing.append(future)
+
+def _analyze_chapter(run: _BookRun, chapter_id: str, chapter_index: int, chapter_title: str):
+    """Steps 1-3 for one chapter: AI analysis, store the results, queue chunk indexing."""
+    with correlation(chapter_index=chapter_index):
+        logger.info("Processing chapter: %s", chapter_title)
+        _analyze_stored_chapter(chapter_id, run.book_id)
+        _index_chapter(run, chapter_id)
+
+def _finish_book(run: _BookRun):
+    """Steps 4-5 once every chapter is analyzed: overview, then mark the book completed."""
+    # Step 4: Generate book-level overview
+    logger.info("Generating book-level overview for %s", run.book_title)
+    book_result = ai.process_book_overview(_overview_input(run.book_id), run.book_title)
+    usage = book_result.get("usage", {})
+    # Chapter usage is added to the book as each chapter is saved
+    store.add_book_usage(run.book_id, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+    
+    # Step 5: Wait for indexing, then update book with overview and mark as completed
+    for future in run.indexing:
+        future.result()
+    store.update_book(run.book_id, {
+        "overview_summary": book_result.get("overview_summary"),
+        "overview_key_points": book_result.get("overview_key_points", []),
+        "overview_questions": book_result.get("overview_questions", []),
+        "status": "completed"
+    })
+    logger.info("Finished background processing")
+
+def _fail_book(book_id: str, e: Exception):
+    metrics.ERRORS.labels("book_processing").inc()
+    tracing.record_error(e)
+    logger.exception("Error in background processing: %s", e)
+    store.update_book(book_id, {"status": "error"})
 
 # Enhanced background task to process book with chapter-level and book-level analysis
-def process_book_background(book_id: str, chapters_data: list, book_title: str, owner_id: Optional[str] = None):
+def process_book_background(book_id: str, book_title: str, owner_id: Optional[str] = None, trace_context=None):
     """
     Background task to process all chapters and generate book-level overview.
+    The chapters are already stored by upload_book; they are processed by ID and
+    their text is read back one chapter at a time, so memory stays bounded by the
+    largest chapter (and OVERVIEW_MAX_CHARS) however long the book is.
     Steps:
-    1. Process each chapter with AI
+    1. Process each chapter with AI (only the first EAGER_CHAPTERS if set)
     2. Store chapter results
-    3. Generate book-level overview
-    4. Mark book as completed
+    3. Index chapter chunks for semantic retrieval (alongside the AI calls; every chapter)
+    4. Generate book-level overview
+    5. Mark book as completed
+    trace_context continues the upload request's trace (see services/tracing.py).
     """
-    print(f"Starting background processing for book {book_id} with {len(chapters_data)} chapters")
+    run = _BookRun(book_id, book_title, owner_id)
+    run.start()
+    with tracing.attached(trace_context), \
+            tracing.tracer.start_as_current_span("process_book_background", attributes={"book.id": book_id}), \
+            correlation(book_id=book_id):
+        try:
+            chapter_refs = store.get_book_chapter_refs(book_id)
+            logger.info("Starting background processing with %d chapters", len(chapter_refs))
+            for position, (chapter_id, chapter_index, chapter_title) in enumerate(chapter_refs):
+                if _is_eager(position):
+                    _analyze_chapter(run, chapter_id, chapter_index, chapter_title)
+                else:
+                    _index_chapter(run, chapter_id)
+            _finish_book(run)
+        except Exception as e:
+            _fail_book(book_id, e)
+        finally:
+            run.stop()
+
+def schedule_book(book_id: str, book_title: str, owner_id: Optional[str] = None, trace_context=None):
+    """
+    Process a stored book like process_book_background, but as one task per chapter
+    on the shared fair scheduler, interleaved with the other books queued there.
+    """
+    run = _BookRun(book_id, book_title, owner_id)
     
-    try:
-        # Step 1 & 2: Process each chapter
-        full_text = ""
-        for chapter_data in chapters_data:
-            chapter_id = f"{book_id}_chapter_{chapter_data['index']}"
-            chapter_text = chapter_data['text']
-            chapter_title = chapter_data['title']
-            full_text += chapter_text + "\n\n"
-            
-            print(f"Processing chapter {chapter_data['index']}: {chapter_title}")
-            
-            # Process chapter with AI
-            chapter_result = ai.process_chapter(chapter_text, chapter_title)
-            
-            # Store chapter in database
-            store.create_chapter({
-                "id": chapter_id,
-                "book_id": book_id,
-                "owner_id": owner_id,
-                "chapter_index": chapter_data['index'],
-                "title": chapter_title,
-                "text": chapter_text,
-                "summary": chapter_result.get("summary"),
-                "key_points": chapter_result.get("key_points", []),
-                "questions": chapter_result.get("questions", [])
-            })
-        
-        # Step 3: Generate book-level overview
-        print(f"Generating book-level overview for {book_title}")
-        book_result = ai.process_book_overview(full_text, book_title)
-        
-        # Step 4: Update book with overview and mark as completed
-        store.update_book(book_id, {
-            "overview_summary": book_result.get("overview_summary"),
-            "overview_key_points": book_result.get("overview_key_points", []),
-            "overview_questions": book_result.get("overview_questions", []),
-            "status": "completed"
-        })
-        
-        print(f"Finished background processing for book {book_id}")
-    except Exception as e:
-        print(f"Error in background processing for book {book_id}: {e}")
-        store.update_book(book_id, {"status": "error"})
+    def analyze(chapter_id: str, chapter_index: int, chapter_title: str):
+        with tracing.attached(trace_context), correlation(book_id=book_id):
+            run.start()
+            if run.failed:
+                return
+            try:
+                _analyze_chapter(run, chapter_id, chapter_index, chapter_title)
+            except Exception as e:
+                # Skip the book's remaining chapters; finish() marks it as failed
+                run.failed = True
+                metrics.ERRORS.labels("chapter_processing").inc()
+                tracing.record_error(e)
+                logger.exception("Error processing chapter %s: %s", chapter_index, e)
+    
+    def finish():
+        with tracing.attached(trace_context), correlation(book_id=book_id):
+            run.start()
+            try:
+                if run.failed:
+                    store.update_book(book_id, {"status": "error"})
+                else:
+                    _finish_book(run)
+            except Exception as e:
+                _fail_book(book_id, e)
+            finally:
+                run.stop()
+    
+    chapter_refs = store.get_book_chapter_refs(book_id)
+    metrics.QUEUE_DEPTH.inc()
+    # Chapters left for their readers only need indexing, which runs on the indexing pool
+    for position, (chapter_id, _, _) in enumerate(chapter_refs):
+        if not _is_eager(position):
+            _index_chapter(run, chapter_id)
+    scheduler.get_scheduler().submit(
+        book_id,
+        [functools.partial(analyze, *ref) for position, ref in enumerate(chapter_refs) if _is_eager(position)],
+        finish
+    )
+
+def _overview_input(book_id: str) -> str:
+    """
+    The whole book's text if it fits OVERVIEW_MAX_CHARS, otherwise its chapter titles
+    and summaries; chapters not analyzed yet contribute the start of their text instead.
+    """
+    if store.get_book_text_chars(book_id) <= OVERVIEW_MAX_CHARS:
+        return "\n\n".join(text for (text,) in store.iter_book_chapter_fields(book_id, "text"))
+    logger.info("Book text exceeds %d characters, overview uses chapter summaries", OVERVIEW_MAX_CHARS)
+    excerpt_chars = max(1, OVERVIEW_MAX_CHARS // max(1, len(store.get_book_chapter_refs(book_id))))
+    return "\n\n".join(
+        f"{title}\n{digest or ''}"
+        for title, digest in store.iter_book_chapter_digests(book_id, excerpt_chars)
+    )
 
 # API endpoint to upload a book
 @app.post("/books", response_model=Book)
 @limiter.limit("5/hour")  # Most restrictive - expensive AI processing
+@tracing.traced("upload_book")
 async def upload_book(
     request: Request,
     background_tasks: BackgroundTasks, 
@@ -146,31 +530,57 @@ async def upload_book(
     """
     Upload a PDF/EPUB file, parse it into chapters, and trigger AI processing.
     Returns immediately with 'processing' status.
+    Rejected with 429 if the user's token budget cannot cover the book.
     """
+    # Cheap check before reading and parsing the upload
+    _check_token_budget(current_user_id)
+    
     content = await file.read()
+    await file.close()
     
-    # Parse book into chapters
-    chapters_data = parser.parse_book_to_chapters(content, file.filename)
+    # Parse book into chapters (off the event loop: large PDFs take seconds and may
+    # wait on a process pool), then let go of the raw upload
+    chapters_data = await run_in_threadpool(parser.parse_book_to_chapters, content, file.filename)
+    del content
     
     if not chapters_data:
+        metrics.ERRORS.labels("upload").inc()
         raise HTTPException(status_code=400, detail="Could not parse file or empty content")
     
+    estimated_tokens = _estimate_book_tokens(chapters_data)
     book_id = str(uuid.uuid4())
+    tracing.set_attributes({"book.id": book_id, "book.chapter_count": len(chapters_data)})
     
-    # Store book in database with initial state
-    new_book = store.create_book({
+    # Store book in database with initial state, reserving its estimated tokens
+    # until it is processed (the reservation is released when its status is final)
+    new_book = await run_in_threadpool(_create_book_within_budget, {
         "id": book_id,
         "title": file.filename,
         "status": "processing",
         "owner_id": current_user_id,
         "chapter_count": len(chapters_data),
+        "reserved_tokens": estimated_tokens,
         "overview_summary": None,
         "overview_key_points": None,
         "overview_questions": None
     })
     
+    # Persist the chapters now; the background task reads them back by ID,
+    # so no chapter text stays referenced while the book is processed
+    try:
+        store.create_chapters(book_id, current_user_id, chapters_data)
+    except Exception:
+        metrics.ERRORS.labels("upload").inc()
+        store.update_book(book_id, {"status": "error"})
+        raise
+    del chapters_data
+    
     # Trigger background task for comprehensive processing
-    background_tasks.add_task(process_book_background, book_id, chapters_data, file.filename, current_user_id)
+    metrics.QUEUE_DEPTH.inc()
+    background_tasks.add_task(
+        process_book_background, book_id, file.filename, current_user_id,
+        trace_context=tracing.current_context()
+    )
     
     # Return book info (convert SQLAlchemy model/dict to response model)
     # store.create_book returns the Book object, we can return it directly or convert to dict
@@ -184,6 +594,164 @@ async def upload_book(
         "overview_questions": new_book.overview_questions
     }
 
+def _batch_status(batch: dict) -> dict:
+    books = batch["books"]
+    completed = sum(book["status"] == "completed" for book in books)
+    failed = sum(book["status"] == "error" for book in books)
+    processing = len(books) - completed - failed
+    
+    # Finished books count in full; others by the share of their chapters analyzed
+    progress = sum(
+        1.0 if book["status"] != "processing"
+        else book["analyzed_chapters"] / book["chapter_count"] if book["chapter_count"] else 0.0
+        for book in books
+    ) / len(books) if books else 1.0
+    
+    if processing:
+        status = "processing"
+    elif books and failed == len(books):
+        status = "error"
+    else:
+        status = "completed"
+    return {
+        "id": batch["id"],
+        "status": status,
+        "book_count": batch["book_count"],
+        "completed": completed,
+        "failed": failed,
+        "processing": processing,
+        "chapter_count": sum(book["chapter_count"] for book in books),
+        "analyzed_chapters": sum(book["analyzed_chapters"] for book in books),
+        "progress": round(progress, 4),
+        "created_at": batch["created_at"],
+        "books": books
+    }
+
+async def _spool_upload(file: UploadFile) -> str:
+    """Copy an upload to a temporary file (1 MB at a time) for the parse pool; returns its path."""
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    with tempfile.NamedTemporaryFile(prefix="readwise-upload-", suffix=suffix, delete=False) as spool:
+        while chunk := await file.read(1 << 20):
+            spool.write(chunk)
+    await file.close()
+    return spool.name
+
+def process_batch_background(batch_id: str, uploads: list, owner_id: str, trace_context=None):
+    """
+    Parse a batch's spooled uploads ((book_id, path, filename) tuples) in the parse
+    process pool and queue each book on the fair scheduler as soon as it is parsed.
+    """
+    with tracing.attached(trace_context), \
+            tracing.tracer.start_as_current_span("process_batch_background", attributes={"batch.id": batch_id}):
+        pool = parser.get_batch_pool()
+        unsubmitted = list(uploads)
+        parsing = {}
+        try:
+            while unsubmitted:
+                book_id, path, filename = unsubmitted[0]
+                future = pool.submit(parser.parse_book_file, path, filename)
+                parsing[future] = unsubmitted.pop(0)
+            for future in as_completed(parsing):
+                book_id, path, filename = parsing[future]
+                with correlation(book_id=book_id):
+                    try:
+                        chapters_data = future.result()
+                        if not chapters_data:
+                            raise ValueError("Could not parse file or empty content")
+                        
+                        # Books queued earlier in the batch count through their reservations;
+                        # a book rejected here reserves nothing
+                        estimated_tokens = _estimate_book_tokens(chapters_data)
+                        with _budget_lock:
+                            _check_token_budget(owner_id, estimated_tokens=estimated_tokens)
+                            store.update_book(book_id, {"reserved_tokens": estimated_tokens})
+                        
+                        store.create_chapters(book_id, owner_id, chapters_data)
+                        store.update_book(book_id, {"chapter_count": len(chapters_data)})
+                        del chapters_data
+                        schedule_book(book_id, filename, owner_id, trace_context=trace_context)
+                    except Exception as e:
+                        if isinstance(e, BrokenProcessPool):
+                            parser.reset_batch_pool(pool)
+                        metrics.ERRORS.labels("batch_upload").inc()
+                        tracing.record_error(e)
+                        logger.error("Could not queue %s: %s", filename, getattr(e, "detail", e))
+                        store.update_book(book_id, {"status": "error"})
+                    finally:
+                        del parsing[future]
+                        os.unlink(path)
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM-killed) and took the pool with it
+            parser.reset_batch_pool(pool)
+            metrics.ERRORS.labels("batch_upload").inc()
+            tracing.record_error(e)
+            logger.error("Batch parse pool is broken, %d books not parsed: %s", len(unsubmitted) + len(parsing), e)
+        finally:
+            # No book is left processing with its spool file behind
+            for book_id, path, filename in unsubmitted + list(parsing.values()):
+                store.update_book(book_id, {"status": "error"})
+                os.unlink(path)
+
+# API endpoint to upload several books at once
+@app.post("/batches", response_model=BatchStatus)
+@limiter.limit("5/hour")  # One batch counts like one upload
+@tracing.traced("upload_batch")
+async def upload_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Upload up to BATCH_MAX_FILES PDF/EPUB files. Returns a batch ID right away; the files
+    are parsed in a process pool and their chapters analyzed on a scheduler shared fairly
+    between books. Track progress with GET /batches/{batch_id}.
+    """
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_FILES} files per batch")
+    unsupported = [f.filename for f in files if not (f.filename or "").lower().endswith((".pdf", ".epub"))]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Only PDF and EPUB files are supported: {', '.join(unsupported)}")
+    
+    # Cheap check before reading the uploads; each book is checked again once parsed
+    _check_token_budget(current_user_id)
+    
+    batch_id = str(uuid.uuid4())
+    tracing.set_attributes({"batch.id": batch_id, "batch.book_count": len(files)})
+    store.create_batch({"id": batch_id, "owner_id": current_user_id, "book_count": len(files)})
+    
+    uploads = []
+    for file in files:
+        path = await _spool_upload(file)
+        book_id = str(uuid.uuid4())
+        store.create_book({
+            "id": book_id,
+            "title": file.filename,
+            "status": "processing",
+            "owner_id": current_user_id,
+            "chapter_count": 0,
+            "batch_id": batch_id
+        })
+        uploads.append((book_id, path, file.filename))
+    
+    background_tasks.add_task(
+        process_batch_background, batch_id, uploads, current_user_id,
+        trace_context=tracing.current_context()
+    )
+    return _batch_status(store.get_batch(batch_id))
+
+# API endpoint to track a batch upload
+@app.get("/batches/{batch_id}", response_model=BatchStatus)
+@limiter.limit("120/hour")  # Progress polling
+async def get_batch(request: Request, batch_id: str, current_user_id: str = Depends(get_current_user_id)):
+    """
+    Get a batch's progress: book counts by status, chapters analyzed so far and each book's status.
+    """
+    batch = store.get_batch(batch_id)
+    if not batch or batch["owner_id"] != str(uuid.UUID(current_user_id)):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return _batch_status(batch)
+
 # API endpoint to list all books
 @app.get("/books", response_model=List[Book])
 @limiter.limit("60/hour")  # General browsing
@@ -193,7 +761,7 @@ async def list_books(request: Request):
     """
     books_dict = store.get_all_books()
     # books_dict is {id: dict}
-    return list(books_dict.values())
+    return _store_response(Book, list(books_dict.values()))
 
 # API endpoint to delete a book
 @app.delete("/books/{book_id}")
@@ -219,7 +787,7 @@ async def get_book(request: Request, book_id: str):
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     
-    return book
+    return _store_response(Book, book)
 
 # API endpoint to get all chapters of a book
 @app.get("/books/{book_id}/chapters", response_model=List[Chapter])
@@ -229,27 +797,122 @@ async def get_book_chapters(request: Request, book_id: str):
     Get all chapters for a book with their summaries, key points, and questions.
     Does not include the full chapter text.
     """
-    # Check if book exists first
-    if not store.get_book(book_id):
+    chapters = store.get_book_chapters(book_id)
+    # Only a book still being parsed has no chapters; otherwise it exists
+    if not chapters and not store.get_book(book_id):
         raise HTTPException(status_code=404, detail="Book not found")
     
-    return store.get_book_chapters(book_id)
+    return _store_response(Chapter, chapters)
 
 # API endpoint to get a specific chapter with full text
 @app.get("/books/{book_id}/chapters/{chapter_index}", response_model=ChapterDetail)
 @limiter.limit("30/hour")  # Reading chapters
-async def get_chapter_detail(request: Request, book_id: str, chapter_index: int):
+async def get_chapter_detail(
+    request: Request,
+    book_id: str,
+    chapter_index: int,
+    current_user_id: str = Depends(get_current_user_id)
+):
     """
     Get full details for a specific chapter including the chapter text.
+    A chapter not analyzed yet (see EAGER_CHAPTERS) is analyzed before it is returned
+    when the book's owner reads it, since the tokens count against the owner's budget.
     """
-    if not store.get_book(book_id):
-        raise HTTPException(status_code=404, detail="Book not found")
-    
-    # Find the chapter
+    # Find the chapter; the book is only looked up when needed
     chapter_id = f"{book_id}_chapter_{chapter_index}"
     chapter = store.get_chapter(chapter_id)
     
     if not chapter:
+        if not store.get_book(book_id):
+            raise HTTPException(status_code=404, detail="Book not found")
         raise HTTPException(status_code=404, detail="Chapter not found")
     
-    return chapter
+    if chapter["summary"] is None and chapter["owner_id"] == str(uuid.UUID(current_user_id)):
+        book = store.get_book(book_id)
+        if book["status"] != "error":
+            chapter = await run_in_threadpool(_analyze_chapter_on_demand, book, chapter)
+    
+    return _store_response(ChapterDetail, chapter)
+
+def _analyze_chapter_on_demand(book: dict, chapter: dict) -> dict:
+    """Analyze a chapter for its reader; on failure (or without budget) it is served unanalyzed."""
+    with correlation(book_id=book["id"], chapter_index=chapter["chapter_index"]):
+        if (book["owner_id"] and USER_TOKEN_BUDGET
+                and ai.estimate_tokens(chapter["text"]) > _user_usage(book["owner_id"])["remaining_tokens"]):
+            metrics.ON_DEMAND_ANALYSES.labels("over_budget").inc()
+            logger.info("Token budget too small for this chapter, serving it without analysis")
+            return chapter
+        try:
+            analyzed, shared = _analyze_stored_chapter(chapter["id"], book["id"])
+        except Exception as e:
+            metrics.ON_DEMAND_ANALYSES.labels("error").inc()
+            metrics.ERRORS.labels("on_demand_analysis").inc()
+            tracing.record_error(e)
+            logger.exception("On-demand chapter analysis failed: %s", e)
+            return chapter
+        if analyzed is None or analyzed["summary"] is None:
+            metrics.ON_DEMAND_ANALYSES.labels("error").inc()
+            return chapter
+        metrics.ON_DEMAND_ANALYSES.labels("joined" if shared else "analyzed").inc()
+        return analyzed
+
+# API endpoint to get LLM token usage for a book
+@app.get("/books/{book_id}/usage", response_model=BookUsage)
+@limiter.limit("60/hour")  # Viewing individual books
+async def get_book_usage(request: Request, book_id: str):
+    """
+    Get prompt/completion token counts for a book, in total and per chapter.
+    """
+    usage = store.get_book_usage(book_id)
+    if not usage:
+        raise HTTPException(status_code=404, detail="Book not found")
+    
+    return usage
+
+# API endpoint to get the current user's LLM token usage
+@app.get("/usage", response_model=UserUsage)
+@limiter.limit("60/hour")
+async def get_user_usage(request: Request, current_user_id: str = Depends(get_current_user_id)):
+    """
+    Get the current user's token usage over the budget window and the remaining budget.
+    """
+    return _user_usage(current_user_id)
+
+# API endpoint to search the current user's library
+@app.get("/search", response_model=SearchResults)
+@limiter.limit("120/hour")  # Interactive search
+async def search_library(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=SEARCH_CANDIDATE_LIMIT),
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Full-text search over the current user's chapters (title, text, summary and key points).
+    Returns ranked results with highlighted snippets, `limit` per page from `offset`.
+    Very broad queries are ranked within the newest SEARCH_CANDIDATE_LIMIT matches.
+    """
+    try:
+        found = await run_in_threadpool(search.search_chapters, current_user_id, q, limit=limit, offset=offset)
+    except NotImplementedError as e:
+        # init_search_index created no index for this database
+        raise HTTPException(status_code=501, detail=str(e))
+    return {"query": q, "limit": limit, "offset": offset, **found}
+
+# API endpoint for semantic retrieval over the current user's library
+@app.get("/retrieve", response_model=RetrievalResults)
+@limiter.limit("120/hour")  # Interactive search
+async def retrieve_passages(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=500),
+    k: int = Query(5, ge=1, le=50),
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Return the k passages of the current user's books most similar in meaning to the query,
+    best first, each with its cosine similarity score.
+    """
+    # Loading or rebuilding the user's index reads the database and runs NumPy; keep it off the event loop
+    results = await run_in_threadpool(retrieval.retrieve, current_user_id, q, k=k)
+    return {"query": q, "k": k, "results": results}
@@ -1 +1,23 @@
 # services package
+import importlib
+from dotenv import load_dotenv
+
+# The one place .env is loaded: importing any service module (from main, a
+# benchmark or a script) reads it before module-level settings are evaluated
+load_dotenv()
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access. Lets
+    main reference heavy modules (SQLAlchemy models, NumPy) without paying
+    for them at cold start; importlib's import lock makes first use thread-safe.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
@@ -1,69 +1,145 @@
 import os
 import json
-from openai import OpenAI
+import time
+import logging
+from services import metrics, tracing
+
+logger = logging.getLogger(__name__)
 
 client = None
 
+def _openai_client():
+    api_key = os.getenv("OPENAI_API_KEY")
+    if api_key:
+        # Imported on first use; the openai package dominates cold-start import time
+        from openai import OpenAI
+        return OpenAI(api_key=api_key)
+    return None
+
+def _mock_client():
+    from services.mock_ai import MockClient
+    return MockClient.from_env()
+
+# AI backends selectable through AI_BACKEND. Every backend exposes the OpenAI
+# client surface used below: client.chat.completions.create(...) returning an
+# object with .choices[0].message.content and .usage.
+BACKENDS = {
+    "openai": _openai_client,
+    "mock": _mock_client,
+}
+
+def register_backend(name: str, factory):
+    """Register a factory returning an OpenAI-compatible client (or None)."""
+    BACKENDS[name] = factory
+
 def get_client():
     global client
     if client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key:
-            client = OpenAI(api_key=api_key)
+        backend = os.getenv("AI_BACKEND", "openai").lower()
+        factory = BACKENDS.get(backend)
+        if factory is None:
+            logger.warning("Unknown AI_BACKEND '%s', AI processing disabled", backend)
+            return None
+        client = factory()
     return client
 
-# Load prompts from files
-def load_chapter_prompt():
-    """Load the chapter-level prompt from the markdown file."""
-    prompt_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "..", "chapter_level_prompt.md")
+def reset_client():
+    """Drop the cached client so the next get_client() call re-reads AI_BACKEND."""
+    global client
+    client = None
+
+# Load prompts from files (read once per process)
+_prompt_cache = {}
+
+def _load_prompt(filename: str, fallback: str) -> str:
+    if filename in _prompt_cache:
+        metrics.CACHE_HITS.labels("prompt").inc()
+        return _prompt_cache[filename]
+    metrics.CACHE_MISSES.labels("prompt").inc()
+
+    prompt_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "..", filename)
     try:
         with open(prompt_path, 'r') as f:
             content = f.read()
             # Extract the prompt (remove markdown quote markers)
             prompt = content.strip().replace('> ', '').replace('>', '')
-            return prompt
     except Exception as e:
-        print(f"Error loading chapter prompt: {e}")
-        return "You are an expert reading coach. Analyze the chapter and provide summary, key points, and questions in JSON format."
+        logger.warning("Error loading prompt %s: %s", filename, e)
+        prompt = fallback
+    _prompt_cache[filename] = prompt
+    return prompt
+
+def load_chapter_prompt():
+    """Load the chapter-level prompt from the markdown file."""
+    return _load_prompt(
+        "chapter_level_prompt.md",
+        "You are an expert reading coach. Analyze the chapter and provide summary, key points, and questions in JSON format."
+    )
 
 def load_book_prompt():
     """Load the book-level prompt from the markdown file."""
-    prompt_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "..", "book_level_prompt.md")
-    try:
-        with open(prompt_path, 'r') as f:
-            content = f.read()
-            # Extract the prompt (remove markdown quote markers)
-            prompt = content.strip().replace('> ', '').replace('>', '')
-            return prompt
-    except Exception as e:
-        print(f"Error loading book prompt: {e}")
-        return "You are an expert reading coach. Analyze the book and provide overview summary, key points, and questions in JSON format."
+    return _load_prompt(
+        "book_level_prompt.md",
+        "You are an expert reading coach. Analyze the book and provide overview summary, key points, and questions in JSON format."
+    )
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) used for budget checks before any LLM call."""
+    return len(text) // 4
+
+def _record_usage(stage: str, response, started: float) -> dict:
+    """Report token usage of a completed call to metrics/tracing and return it with its latency."""
+    usage = getattr(response, "usage", None)
+    result = {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "latency_ms": int((time.perf_counter() - started) * 1000),
+    }
+    metrics.record_llm_usage(stage, usage)
+    tracing.set_attributes({
+        "llm.prompt_tokens": result["prompt_tokens"],
+        "llm.completion_tokens": result["completion_tokens"],
+    })
+    return result
 
+def _no_usage() -> dict:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "latency_ms": None}
+
+@tracing.traced("ai.process_chapter")
 def process_chapter(chapter_text: str, chapter_title: str = "Chapter") -> dict:
     """
     Process a single chapter using the chapter-level prompt.
-    Returns: {summary: str, key_points: list, questions: list}
+    Returns: {summary: str, key_points: list, questions: list, usage: dict}
+    usage holds prompt_tokens, completion_tokens and latency_ms of the LLM call.
+    When the chapter could not be analyzed the result also has an `error` message,
+    and its summary, key points and questions are placeholders not meant to be stored.
     """
     client = get_client()
     if not client:
         return {
             "summary": "AI Client not configured.",
             "key_points": ["AI processing unavailable"],
-            "questions": ["AI processing unavailable"]
+            "questions": ["AI processing unavailable"],
+            "usage": _no_usage(),
+            "error": "AI Client not configured."
         }
     
+    usage = _no_usage()
     try:
         prompt = load_chapter_prompt()
         user_message = f"{prompt}\n\nChapter Title: {chapter_title}\n\nChapter Text:\n{chapter_text}"
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert reading coach and strategist. Always respond with valid JSON."},
-                {"role": "user", "content": user_message}
-            ],
-            response_format={"type": "json_object"}
-        )
+        started = time.perf_counter()
+        with metrics.LLM_CALL_SECONDS.labels("chapter").time():
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "You are an expert reading coach and strategist. Always respond with valid JSON."},
+                    {"role": "user", "content": user_message}
+                ],
+                response_format={"type": "json_object"}
+            )
+        usage = _record_usage("chapter", response, started)
         
         result = json.loads(response.choices[0].message.content)
         
@@ -71,41 +147,52 @@ def process_chapter(chapter_text: str, chapter_title: str = "Chapter") -> dict:
         return {
             "summary": result.get("summary", ""),
             "key_points": result.get("key_points", []),
-            "questions": result.get("questions", [])
+            "questions": result.get("questions", []),
+            "usage": usage
         }
     except Exception as e:
-        print(f"Error processing chapter '{chapter_title}': {e}")
+        metrics.ERRORS.labels("llm_chapter").inc()
+        tracing.record_error(e)
+        logger.error("Error processing chapter '%s': %s", chapter_title, e)
         return {
             "summary": f"Error processing chapter: {str(e)}",
             "key_points": ["Error generating key points"],
-            "questions": ["Error generating questions"]
+            "questions": ["Error generating questions"],
+            "usage": usage,
+            "error": str(e)
         }
 
+@tracing.traced("ai.process_book_overview")
 def process_book_overview(full_text: str, book_title: str) -> dict:
     """
     Process the entire book to generate book-level overview.
-    Returns: {overview_summary: str, overview_key_points: list, overview_questions: list}
+    Returns: {overview_summary: str, overview_key_points: list, overview_questions: list, usage: dict}
     """
     client = get_client()
     if not client:
         return {
             "overview_summary": "AI Client not configured.",
             "overview_key_points": ["AI processing unavailable"],
-            "overview_questions": ["AI processing unavailable"]
+            "overview_questions": ["AI processing unavailable"],
+            "usage": _no_usage()
         }
     
+    usage = _no_usage()
     try:
         prompt = load_book_prompt()
         user_message = f"{prompt}\n\nBook Title: {book_title}\n\nBook Text:\n{full_text}"
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert reading coach and strategist. Always respond with valid JSON."},
-                {"role": "user", "content": user_message}
-            ],
-            response_format={"type": "json_object"}
-        )
+        started = time.perf_counter()
+        with metrics.LLM_CALL_SECONDS.labels("overview").time():
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "You are an expert reading coach and strategist. Always respond with valid JSON."},
+                    {"role": "user", "content": user_message}
+                ],
+                response_format={"type": "json_object"}
+            )
+        usage = _record_usage("overview", response, started)
         
         result = json.loads(response.choices[0].message.content)
         
@@ -113,14 +200,18 @@ def process_book_overview(full_text: str, book_title: str) -> dict:
         return {
             "overview_summary": result.get("overview_summary", ""),
             "overview_key_points": result.get("overview_key_points", []),
-            "overview_questions": result.get("overview_questions", [])
+            "overview_questions": result.get("overview_questions", []),
+            "usage": usage
         }
     except Exception as e:
-        print(f"Error processing book overview for '{book_title}': {e}")
+        metrics.ERRORS.labels("llm_overview").inc()
+        tracing.record_error(e)
+        logger.error("Error processing book overview for '%s': %s", book_title, e)
         return {
             "overview_summary": f"Error processing book overview: {str(e)}",
             "overview_key_points": ["Error generating key points"],
-            "overview_questions": ["Error generating questions"]
+            "overview_questions": ["Error generating questions"],
+            "usage": usage
         }
 
 # Legacy functions for backward compatibility (deprecated)
@@ -143,7 +234,7 @@ def generate_summary(text: str) -> str:
         )
         return response.choices[0].message.content
     except Exception as e:
-        print(f"Error generating summary: {e}")
+        logger.error("Error generating summary: %s", e)
         return "Error generating summary."
 
 def generate_key_points(text: str) -> str:
@@ -165,7 +256,7 @@ def generate_key_points(text: str) -> str:
         )
         return response.choices[0].message.content
     except Exception as e:
-        print(f"Error generating key points: {e}")
+        logger.error("Error generating key points: %s", e)
         return "Error generating key points."
 
 def generate_questions(text: str) -> str:
@@ -187,5 +278,5 @@ def generate_questions(text: str) -> str:
         )
         return response.choices[0].message.content
     except Exception as e:
-        print(f"Error generating questions: {e}")
+        logger.error("Error generating questions: %s", e)
         return "Error generating questions."
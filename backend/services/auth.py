@@ -1,5 +1,6 @@
 import os
 import jwt
+import logging
 from fastapi import HTTPException, Security, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from typing import Optional
@@ -7,6 +8,8 @@ from typing import Optional
 # Supabase uses HS256 by default for signing tokens
 ALGORITHM = "HS256"
 
+logger = logging.getLogger(__name__)
+
 security = HTTPBearer()
 
 def get_supabase_jwt_secret():
@@ -15,7 +18,7 @@ def get_supabase_jwt_secret():
         # Fallback for development if not set, but ideally should be in .env
         # This allows the app to start even if the secret is missing, 
         # but auth will fail if real tokens are sent.
-        print("WARNING: SUPABASE_JWT_SECRET not set in .env")
+        logger.warning("SUPABASE_JWT_SECRET not set in .env")
         return "your-super-secret-jwt-token-with-at-least-32-characters-long"
     return secret
 
@@ -60,7 +63,7 @@ async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Securi
             headers={"WWW-Authenticate": "Bearer"},
         )
     except Exception as e:
-        print(f"Auth error: {e}")
+        logger.error("Auth error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
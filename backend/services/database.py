@@ -2,9 +2,9 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
-from dotenv import load_dotenv
+import logging
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 # Get database URL from environment variable
 # Default to sqlite for development if not set, but we aim for Postgres
@@ -13,7 +13,7 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     # Fallback or warning - for now let's assume the user will provide it
     # But to avoid crashing immediately if they haven't set it yet:
-    print("WARNING: DATABASE_URL not set in .env")
+    logger.warning("DATABASE_URL not set in .env")
     SQLALCHEMY_DATABASE_URL = "sqlite:///./readwise.db"
 
 # Handle special case for Supabase/Postgres where URL might start with postgres://
@@ -38,5 +38,6 @@ def get_db():
 
 def init_db():
     # Import models here to avoid circular imports
-    from services import models
+    from services import models, search
     Base.metadata.create_all(bind=engine)
+    search.init_search_index(engine)
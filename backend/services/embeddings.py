@@ -0,0 +1,128 @@
+"""
+Text chunking and pluggable embedding backends.
+
+EMBEDDING_BACKEND selects the embedder:
+    hashing (default)      feature-hashed word unigrams/bigrams; no model, works offline
+    sentence-transformers  local model EMBEDDING_MODEL (default all-MiniLM-L6-v2),
+                           requires `pip install sentence-transformers`
+
+Every embedder returns L2-normalized float32 rows, so a dot product is the
+cosine similarity. Batches of EMBEDDING_BATCH_SIZE texts are embedded in a
+pool of EMBEDDING_WORKERS threads.
+"""
+import os
+import re
+import zlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "2"))
+CHUNK_WORDS = int(os.getenv("EMBEDDING_CHUNK_WORDS", "200"))
+CHUNK_OVERLAP_WORDS = int(os.getenv("EMBEDDING_CHUNK_OVERLAP_WORDS", "40"))
+
+_WORD = re.compile(r"\w+")
+
+def chunk_text(text: str, chunk_words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP_WORDS) -> List[str]:
+    """Split text into chunks of `chunk_words` words, consecutive chunks sharing `overlap` words."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of lowercased word unigrams and bigrams. Stable across
+    processes (crc32, not hash()), so stored vectors stay comparable after restarts.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _embed_one(self, text: str, out: np.ndarray):
+        words = _WORD.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        if not features:
+            return
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        out += np.bincount(hashes % self.dim, weights=signs, minlength=self.dim)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float64)
+        for row, text in enumerate(texts):
+            self._embed_one(text, vectors[row])
+        return _normalize(vectors)
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model; downloaded once, then runs offline."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=EMBEDDING_BATCH_SIZE, convert_to_numpy=True)
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+EMBEDDERS = {
+    "hashing": lambda: HashingEmbedder(int(os.getenv("EMBEDDING_DIM", "384"))),
+    "sentence-transformers": lambda: SentenceTransformerEmbedder(os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")),
+}
+
+def register_embedder(name: str, factory):
+    """Register a factory returning an object with .dim, .name and .embed(texts) -> float32 ndarray."""
+    EMBEDDERS[name] = factory
+
+_embedder = None
+_embedder_lock = threading.Lock()
+_pool = None
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                backend = os.getenv("EMBEDDING_BACKEND", "hashing").lower()
+                if backend not in EMBEDDERS:
+                    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'")
+                _embedder = EMBEDDERS[backend]()
+                logger.info("Using embedder %s (dim %d)", _embedder.name, _embedder.dim)
+    return _embedder
+
+def get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _embedder_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS, thread_name_prefix="embed")
+    return _pool
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed texts in batches of EMBEDDING_BATCH_SIZE, in parallel when there is more than one batch."""
+    embedder = get_embedder()
+    if not texts:
+        return np.zeros((0, embedder.dim), dtype=np.float32)
+    batches = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+    if len(batches) == 1:
+        return embedder.embed(batches[0])
+    return np.vstack(list(get_pool().map(embedder.embed, batches)))
@@ -0,0 +1,242 @@
+"""
+Structural EPUB parsing.
+
+Chapters come from the package structure rather than text heuristics: the OPF
+spine gives reading order and the EPUB 3 navigation document (or the EPUB 2
+NCX) gives chapter titles and where each chapter starts. Each TOC entry starts
+a chapter that runs until the spine document of the next entry.
+
+Only the zip central directory is read up front; each spine document is
+decompressed on demand and streamed through the HTML text extractor.
+"""
+import io
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from html.parser import HTMLParser
+from urllib.parse import unquote
+from typing import Dict, Iterator, List, Optional, Tuple
+
+CONTAINER_NS = "{urn:oasis:names:tc:opendocument:xmlns:container}"
+OPF_NS = "{http://www.idpf.org/2007/opf}"
+NCX_NS = "{http://www.daisy.org/z3986/2005/ncx/}"
+XHTML_NS = "{http://www.w3.org/1999/xhtml}"
+OPS_NS = "{http://www.idpf.org/2007/ops}"
+
+# Spine documents before the first TOC entry (cover, title page, copyright)
+# only become a chapter if they hold at least this much text
+MIN_FRONT_MATTER_CHARS = 500
+
+_READ_CHUNK = 64 * 1024
+
+_BLOCK_TAGS = {
+    "p", "div", "br", "li", "tr", "section", "article", "blockquote", "pre",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "dt", "dd", "figcaption",
+}
+_SKIP_TAGS = {"script", "style", "head", "title", "svg"}
+_HEADING_TAGS = {"h1", "h2", "h3"}
+
+class EpubError(Exception):
+    """The archive is not a readable EPUB."""
+
+class _TextExtractor(HTMLParser):
+    """Collect the visible text of an XHTML document and its first heading."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.heading: Optional[str] = None
+        self._skip_depth = 0
+        self._heading_parts: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+        if tag in _HEADING_TAGS and self.heading is None and self._heading_parts is None:
+            self._heading_parts = []
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+        if tag in _HEADING_TAGS and self._heading_parts is not None:
+            self.heading = _clean_title("".join(self._heading_parts)) or None
+            self._heading_parts = None
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self.parts.append(data)
+        if self._heading_parts is not None:
+            self._heading_parts.append(data)
+
+    def text(self) -> str:
+        text = "".join(self.parts)
+        text = re.sub(r"[ \t\r\f\v]+", " ", text)
+        text = re.sub(r" *\n *", "\n", text)
+        return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def _clean_title(title: str) -> str:
+    return " ".join(title.split())
+
+def _resolve(base_dir: str, href: str) -> str:
+    """Resolve an href relative to a document directory to a zip member name (fragment dropped)."""
+    path = unquote(href.split("#", 1)[0])
+    return posixpath.normpath(posixpath.join(base_dir, path)) if base_dir else posixpath.normpath(path)
+
+def _read_xml(archive: zipfile.ZipFile, name: str) -> ET.Element:
+    with archive.open(name) as f:
+        return ET.parse(f).getroot()
+
+def _extract_text(archive: zipfile.ZipFile, name: str) -> Tuple[str, Optional[str]]:
+    extractor = _TextExtractor()
+    with archive.open(name) as raw:
+        stream = io.TextIOWrapper(raw, encoding="utf-8", errors="replace")
+        while True:
+            chunk = stream.read(_READ_CHUNK)
+            if not chunk:
+                break
+            extractor.feed(chunk)
+    extractor.close()
+    return extractor.text(), extractor.heading
+
+def _read_package(archive: zipfile.ZipFile):
+    """Return (spine member names, nav member name, ncx member name) from the OPF package."""
+    try:
+        container = _read_xml(archive, "META-INF/container.xml")
+    except KeyError:
+        raise EpubError("Missing META-INF/container.xml")
+    rootfile = container.find(f".//{CONTAINER_NS}rootfile")
+    if rootfile is None or not rootfile.get("full-path"):
+        raise EpubError("container.xml has no rootfile")
+    opf_path = rootfile.get("full-path")
+    opf_dir = posixpath.dirname(opf_path)
+    package = _read_xml(archive, opf_path)
+
+    manifest: Dict[str, str] = {}
+    nav_name = None
+    for item in package.iterfind(f"{OPF_NS}manifest/{OPF_NS}item"):
+        name = _resolve(opf_dir, item.get("href", ""))
+        manifest[item.get("id")] = name
+        if "nav" in (item.get("properties") or "").split():
+            nav_name = name
+
+    spine_element = package.find(f"{OPF_NS}spine")
+    if spine_element is None:
+        raise EpubError("Package has no spine")
+    ncx_name = manifest.get(spine_element.get("toc"))
+
+    members = set(archive.namelist())
+    spine = []
+    for itemref in spine_element.iterfind(f"{OPF_NS}itemref"):
+        if itemref.get("linear", "yes") == "no":
+            continue
+        name = manifest.get(itemref.get("idref"))
+        if name and name in members:
+            spine.append(name)
+    return spine, nav_name, ncx_name
+
+def _read_nav_toc(archive: zipfile.ZipFile, nav_name: str) -> List[Tuple[str, str]]:
+    root = _read_xml(archive, nav_name)
+    nav_dir = posixpath.dirname(nav_name)
+    toc_nav = None
+    for nav in root.iter(f"{XHTML_NS}nav"):
+        if "toc" in (nav.get(f"{OPS_NS}type") or "").split():
+            toc_nav = nav
+            break
+    if toc_nav is None:
+        return []
+    entries = []
+    for link in toc_nav.iter(f"{XHTML_NS}a"):
+        href = link.get("href")
+        title = _clean_title("".join(link.itertext()))
+        if href and title:
+            entries.append((title, _resolve(nav_dir, href)))
+    return entries
+
+def _read_ncx_toc(archive: zipfile.ZipFile, ncx_name: str) -> List[Tuple[str, str]]:
+    root = _read_xml(archive, ncx_name)
+    ncx_dir = posixpath.dirname(ncx_name)
+    entries = []
+    # iter() walks navPoints in document order, which flattens nesting in reading order
+    for nav_point in root.iter(f"{NCX_NS}navPoint"):
+        label = nav_point.find(f"{NCX_NS}navLabel/{NCX_NS}text")
+        content = nav_point.find(f"{NCX_NS}content")
+        if label is None or content is None or not content.get("src"):
+            continue
+        title = _clean_title(label.text or "")
+        if title:
+            entries.append((title, _resolve(ncx_dir, content.get("src"))))
+    return entries
+
+def _read_toc(archive: zipfile.ZipFile, nav_name: Optional[str], ncx_name: Optional[str]) -> List[Tuple[str, str]]:
+    members = set(archive.namelist())
+    for name, reader in ((nav_name, _read_nav_toc), (ncx_name, _read_ncx_toc)):
+        if name and name in members:
+            try:
+                entries = reader(archive, name)
+            except ET.ParseError:
+                continue
+            if entries:
+                return entries
+    return []
+
+def _chapter_starts(spine: List[str], toc: List[Tuple[str, str]]) -> List[Tuple[int, str]]:
+    """Map TOC entries to (spine position, title), first title per spine document, in spine order."""
+    positions = {name: i for i, name in enumerate(spine)}
+    starts = {}
+    for title, name in toc:
+        position = positions.get(name)
+        if position is not None and position not in starts:
+            starts[position] = title
+    return sorted(starts.items())
+
+def iter_epub_chapters(file_content: bytes) -> Iterator[Dict[str, any]]:
+    """
+    Yield chapters of an EPUB as {title: str, text: str, index: int} in reading order.
+    Raises EpubError if the archive is not a readable EPUB.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(file_content))
+    except zipfile.BadZipFile as e:
+        raise EpubError(f"Not a zip archive: {e}")
+
+    with archive:
+        spine, nav_name, ncx_name = _read_package(archive)
+        starts = _chapter_starts(spine, _read_toc(archive, nav_name, ncx_name))
+
+        front_matter_end = 0
+        if not starts:
+            # Without a usable TOC every spine document is its own chapter
+            starts = [(i, None) for i in range(len(spine))]
+        elif starts[0][0] > 0:
+            front_matter_end = starts[0][0]
+            starts.insert(0, (0, "Front Matter"))
+
+        index = 0
+        for n, (position, title) in enumerate(starts):
+            end = starts[n + 1][0] if n + 1 < len(starts) else len(spine)
+            texts = []
+            heading = None
+            for name in spine[position:end]:
+                text, doc_heading = _extract_text(archive, name)
+                heading = heading or doc_heading
+                if text:
+                    texts.append(text)
+            chapter_text = "\n\n".join(texts)
+
+            if not chapter_text:
+                continue
+            if position < front_matter_end and len(chapter_text) < MIN_FRONT_MATTER_CHARS:
+                continue
+
+            yield {
+                "index": index,
+                "title": title or heading or f"Section {index + 1}",
+                "text": chapter_text
+            }
+            index += 1
@@ -0,0 +1,82 @@
+"""
+Structured logging with book/chapter correlation IDs.
+
+Call configure_logging() once at startup and use logging.getLogger(__name__)
+everywhere else. Wrap work on a book or chapter in `with correlation(...)` and
+every record logged inside carries book_id / chapter_index.
+
+LOG_FORMAT=json (default) emits one JSON object per line, LOG_FORMAT=text a
+human readable line. LOG_LEVEL sets the level (default INFO).
+"""
+import os
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+book_id_var: ContextVar[Optional[str]] = ContextVar("book_id", default=None)
+chapter_index_var: ContextVar[Optional[int]] = ContextVar("chapter_index", default=None)
+
+# Attributes present on every LogRecord; anything else was passed via `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class CorrelationFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.book_id = book_id_var.get()
+        record.chapter_index = chapter_index_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        ids = [f"{key}={getattr(record, key)}" for key in ("book_id", "chapter_index")
+               if getattr(record, key, None) is not None]
+        return f"{line} [{' '.join(ids)}]" if ids else line
+
+_configured = False
+
+def configure_logging():
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    root = logging.getLogger()
+    handler = logging.StreamHandler()
+    handler.addFilter(CorrelationFilter())
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+@contextmanager
+def correlation(book_id: Optional[str] = None, chapter_index: Optional[int] = None):
+    """Attach book/chapter IDs to every log record emitted inside the block."""
+    tokens = []
+    if book_id is not None:
+        tokens.append((book_id_var, book_id_var.set(book_id)))
+    if chapter_index is not None:
+        tokens.append((chapter_index_var, chapter_index_var.set(chapter_index)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
@@ -0,0 +1,96 @@
+"""
+Prometheus metrics for the book processing pipeline, exposed on GET /metrics.
+
+Histograms and counters carry a `stage` label:
+- STAGE_SECONDS: pdf_parse, chapter_detection, book_processing
+- LLM_CALL_SECONDS / LLM_TOKENS: chapter, overview
+- DB_WRITE_SECONDS: create_book, update_book, delete_book, create_chapter(s), update_chapter,
+  save_chapter_analysis, add_book_usage, create_chunks
+- ERRORS / CACHE_HITS / CACHE_MISSES: the stage the event happened in
+
+ON_DEMAND_ANALYSES counts chapters analyzed when first read, by `outcome`:
+analyzed (made the LLM call), joined (waited for another reader's call),
+over_budget (served without analysis), error.
+"""
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+
+STAGE_SECONDS = Histogram(
+    "readwise_stage_seconds",
+    "Time spent in a pipeline stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_CALL_SECONDS = Histogram(
+    "readwise_llm_call_seconds",
+    "Latency of a single LLM call",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_TOKENS = Histogram(
+    "readwise_llm_tokens",
+    "Tokens used by a single LLM call",
+    ["stage", "kind"],  # kind: prompt, completion
+    buckets=TOKEN_BUCKETS,
+)
+
+DB_WRITE_SECONDS = Histogram(
+    "readwise_db_write_seconds",
+    "Latency of a database write (including commit)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+QUEUE_DEPTH = Gauge(
+    "readwise_queue_depth",
+    "Books accepted for processing that have not started yet",
+)
+
+IN_FLIGHT_BOOKS = Gauge(
+    "readwise_in_flight_books",
+    "Books currently being processed",
+)
+
+SCHEDULED_CHAPTERS = Gauge(
+    "readwise_scheduled_chapters",
+    "Chapters of batch uploads waiting in the fair scheduler",
+)
+
+ON_DEMAND_ANALYSES = Counter(
+    "readwise_on_demand_analyses_total",
+    "Chapter analyses requested by a reader, by outcome",
+    ["outcome"],
+)
+
+ERRORS = Counter(
+    "readwise_errors_total",
+    "Errors by pipeline stage",
+    ["stage"],
+)
+
+CACHE_HITS = Counter(
+    "readwise_cache_hits_total",
+    "Cache hits by stage",
+    ["stage"],
+)
+
+CACHE_MISSES = Counter(
+    "readwise_cache_misses_total",
+    "Cache misses by stage",
+    ["stage"],
+)
+
+def record_llm_usage(stage: str, usage) -> None:
+    """Record prompt/completion token counts from an OpenAI-style usage object."""
+    if usage is None:
+        return
+    LLM_TOKENS.labels(stage, "prompt").observe(getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.labels(stage, "completion").observe(getattr(usage, "completion_tokens", 0) or 0)
+
+def render():
+    """Return (body, content_type) for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
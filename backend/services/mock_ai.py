@@ -0,0 +1,117 @@
+"""
+Deterministic local stand-in for the OpenAI client.
+
+Selected with AI_BACKEND=mock. Responses, simulated failures and token usage
+are derived from a hash of the request, so the same book always produces the
+same output. Tunables (all optional):
+
+    MOCK_AI_LATENCY_MS        base latency per call (default 50)
+    MOCK_AI_JITTER_MS         extra uniform latency on top of the base (default 0)
+    MOCK_AI_ERROR_RATE        fraction of calls that raise MockAIError (default 0)
+    MOCK_AI_CHARS_PER_TOKEN   prompt characters per reported token (default 4)
+    MOCK_AI_COMPLETION_TOKENS completion tokens reported per call (default 300)
+    MOCK_AI_SEED              seed mixed into every request hash (default 0)
+"""
+import os
+import json
+import time
+import random
+import hashlib
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+class MockAIError(Exception):
+    """Simulated upstream failure."""
+
+@dataclass
+class MockUsage:
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+
+@dataclass
+class MockMessage:
+    content: str
+    role: str = "assistant"
+
+@dataclass
+class MockChoice:
+    message: MockMessage
+    index: int = 0
+    finish_reason: str = "stop"
+
+@dataclass
+class MockResponse:
+    choices: List[MockChoice]
+    usage: MockUsage
+    model: str = "mock"
+
+class _Completions:
+    def __init__(self, owner: "MockClient"):
+        self._owner = owner
+
+    def create(self, model: str = "mock", messages: Optional[list] = None, **kwargs) -> MockResponse:
+        return self._owner._complete(model, messages or [])
+
+class _Chat:
+    def __init__(self, owner: "MockClient"):
+        self.completions = _Completions(owner)
+
+@dataclass
+class MockClient:
+    latency_ms: float = 50.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    chars_per_token: float = 4.0
+    completion_tokens: int = 300
+    seed: int = 0
+    calls: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        self.chat = _Chat(self)
+
+    @classmethod
+    def from_env(cls) -> "MockClient":
+        return cls(
+            latency_ms=float(os.getenv("MOCK_AI_LATENCY_MS", "50")),
+            jitter_ms=float(os.getenv("MOCK_AI_JITTER_MS", "0")),
+            error_rate=float(os.getenv("MOCK_AI_ERROR_RATE", "0")),
+            chars_per_token=float(os.getenv("MOCK_AI_CHARS_PER_TOKEN", "4")),
+            completion_tokens=int(os.getenv("MOCK_AI_COMPLETION_TOKENS", "300")),
+            seed=int(os.getenv("MOCK_AI_SEED", "0")),
+        )
+
+    def _complete(self, model: str, messages: list) -> MockResponse:
+        self.calls += 1
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        digest = hashlib.sha256(f"{self.seed}:{model}:{prompt}".encode("utf-8")).hexdigest()
+        rng = random.Random(int(digest[:16], 16))
+
+        delay_ms = self.latency_ms + rng.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+        if rng.random() < self.error_rate:
+            raise MockAIError(f"Simulated AI failure ({digest[:8]})")
+
+        tag = digest[:8]
+        # Both result shapes are returned; callers pick the keys they expect.
+        content = json.dumps({
+            "summary": f"Mock summary {tag}.",
+            "key_points": [f"Mock key point {tag}-{i}" for i in range(1, 4)],
+            "questions": [f"Mock question {tag}-{i}?" for i in range(1, 4)],
+            "overview_summary": f"Mock overview {tag}.",
+            "overview_key_points": [f"Mock overview point {tag}-{i}" for i in range(1, 4)],
+            "overview_questions": [f"Mock overview question {tag}-{i}?" for i in range(1, 4)],
+        })
+
+        prompt_tokens = max(1, int(len(prompt) / self.chars_per_token))
+        return MockResponse(
+            choices=[MockChoice(message=MockMessage(content=content))],
+            usage=MockUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=self.completion_tokens,
+                total_tokens=prompt_tokens + self.completion_tokens,
+            ),
+            model=model,
+        )
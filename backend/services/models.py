@@ -1,9 +1,10 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON, LargeBinary, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from services.database import Base
 import uuid
+from datetime import datetime, timezone
 
 def generate_uuid():
     return str(uuid.uuid4())
@@ -16,18 +17,33 @@ class Book(Base):
     status = Column(String, default="processing")  # processing, completed, error
     owner_id = Column(UUID(as_uuid=True), nullable=True)  # Added owner_id
     chapter_count = Column(Integer, default=0)
+    batch_id = Column(String, ForeignKey("batches.id"), nullable=True, index=True)  # set for batch uploads
     
     # AI Analysis
     overview_summary = Column(Text, nullable=True)
     overview_key_points = Column(JSON, nullable=True)
     overview_questions = Column(JSON, nullable=True)
     
+    # LLM token usage, summed over all chapters plus the overview
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    # Estimated tokens held against the owner's budget while the book is processed
+    reserved_tokens = Column(Integer, default=0)
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     chapters = relationship("Chapter", back_populates="book", cascade="all, delete-orphan")
 
+class Batch(Base):
+    __tablename__ = "batches"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    owner_id = Column(UUID(as_uuid=True), nullable=True)
+    book_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Chapter(Base):
     __tablename__ = "chapters"
 
@@ -43,7 +59,32 @@ class Chapter(Base):
     key_points = Column(JSON, nullable=True)
     questions = Column(JSON, nullable=True)
     
+    # LLM usage for this chapter's analysis
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    llm_latency_ms = Column(Integer, nullable=True)
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     book = relationship("Book", back_populates="chapters")
+    chunks = relationship("ChapterChunk", back_populates="chapter", cascade="all, delete-orphan")
+
+class ChapterChunk(Base):
+    __tablename__ = "chapter_chunks"
+
+    id = Column(String, primary_key=True) # format: {chapter_id}_chunk_{index}
+    chapter_id = Column(String, ForeignKey("chapters.id"), nullable=False, index=True)
+    book_id = Column(String, nullable=False)
+    owner_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32 vector bytes
+    # Lets retrieval indexes load only the chunks added since their last load;
+    # set client-side so SQLite keeps sub-second precision too
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+
+    # Relationships
+    chapter = relationship("Chapter", back_populates="chunks")
+
+    __table_args__ = (Index("ix_chapter_chunks_owner_created", "owner_id", "created_at"),)
@@ -0,0 +1,238 @@
+"""
+Semantic retrieval over chapter chunks.
+
+Chapters are chunked and embedded (services/embeddings.py) as the pipeline
+stores them; vectors are persisted in chapter_chunks as float32 bytes. Each
+process keeps an in-memory VectorIndex per owner, loaded lazily from the
+database and topped up with the chunks created since its last load when the
+owner's chunk count or newest chunk changes, so every worker sees chunks
+written by the others. An index that turns out to hold deleted chunks is
+rebuilt.
+
+Search is a vectorized brute-force dot product over a contiguous float32
+matrix. Once an index holds IVF_MIN_VECTORS vectors it also trains an IVF
+(inverted file) partition with spherical k-means and only scans the
+IVF_PROBES closest partitions per query.
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from services import embeddings, metrics, store, tracing
+
+logger = logging.getLogger(__name__)
+
+IVF_MIN_VECTORS = int(os.getenv("IVF_MIN_VECTORS", "100000"))
+IVF_PROBES = int(os.getenv("IVF_PROBES", "16"))
+IVF_TRAIN_ITERATIONS = 10
+# Owner indexes kept in memory per process (least recently used are dropped)
+RETRIEVAL_CACHE_OWNERS = int(os.getenv("RETRIEVAL_CACHE_OWNERS", "16"))
+
+class VectorIndex:
+    """Append-only top-k cosine index over L2-normalized float32 vectors."""
+
+    def __init__(self, dim: int, ivf_min_vectors: int = IVF_MIN_VECTORS, probes: int = IVF_PROBES):
+        self.dim = dim
+        self.ids: List[str] = []
+        self.size = 0
+        self.ivf_min_vectors = ivf_min_vectors
+        self.probes = probes
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._trained_size = 0
+        self._lock = threading.RLock()
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            needed = self.size + len(vectors)
+            if needed > len(self._vectors):
+                # Grow geometrically so appends stay amortized O(1)
+                grown = np.empty((max(needed, 2 * len(self._vectors), 1024), self.dim), dtype=np.float32)
+                grown[:self.size] = self._vectors[:self.size]
+                self._vectors = grown
+            self._vectors[self.size:needed] = vectors
+            self.ids.extend(ids)
+            start, self.size = self.size, needed
+
+            if self.size >= self.ivf_min_vectors and self.size >= 2 * self._trained_size:
+                self._train()
+            elif self._centroids is not None:
+                self._assign_to_lists(np.arange(start, self.size))
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            if self.size == 0:
+                return []
+            if self._centroids is None:
+                rows = None
+                scores = self._vectors[:self.size] @ query
+            else:
+                nearest = np.argsort(self._centroids @ query)[::-1][:self.probes]
+                rows = np.concatenate([self._lists[c] for c in nearest])
+                scores = self._vectors[rows] @ query
+            ids = self.ids
+
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        positions = top if rows is None else rows[top]
+        return [(ids[p], float(scores[i])) for p, i in zip(positions, top)]
+
+    def _train(self):
+        vectors = self._vectors[:self.size]
+        nlist = int(np.clip(np.sqrt(self.size), 16, 4096))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(self.size, size=min(self.size, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty partitions from random sample rows
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self._centroids = centroids
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self._trained_size = self.size
+        self._assign_to_lists(np.arange(self.size))
+        logger.info("Trained IVF index: %d vectors, %d partitions", self.size, nlist)
+
+    def _assign_to_lists(self, rows: np.ndarray):
+        for batch_start in range(0, len(rows), 65536):
+            batch = rows[batch_start:batch_start + 65536]
+            assignment = np.argmax(self._vectors[batch] @ self._centroids.T, axis=1)
+            order = np.argsort(assignment, kind="stable")
+            bounds = np.searchsorted(assignment[order], np.arange(len(self._centroids) + 1))
+            for c in np.nonzero(np.diff(bounds))[0]:
+                self._lists[c] = np.concatenate([self._lists[c], batch[order[bounds[c]:bounds[c + 1]]]])
+
+class _OwnerIndex:
+    """An owner's index plus what has been loaded into it; lock serializes loads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index: Optional[VectorIndex] = None
+        self.newest = None  # created_at of the newest loaded chunk
+        self.newest_ids: set = set()  # loaded chunks created at exactly `newest`
+
+    def load(self, rows, dim: int, rebuild: bool):
+        if rebuild:
+            self.index, self.newest, self.newest_ids = VectorIndex(dim), None, set()
+        else:
+            # Rows at the old high-water mark may already be loaded
+            rows = [row for row in rows if row.created_at != self.newest or row.id not in self.newest_ids]
+        self.index.add([row.id for row in rows], _vectors_from_rows(rows, self.index.dim))
+        for row in rows:
+            if self.newest is None or row.created_at > self.newest:
+                self.newest, self.newest_ids = row.created_at, {row.id}
+            elif row.created_at == self.newest:
+                self.newest_ids.add(row.id)
+
+_indexes: "OrderedDict[str, _OwnerIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+_indexer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indexer")
+
+def _vectors_from_rows(rows, dim: int) -> np.ndarray:
+    return np.frombuffer(b"".join(row.embedding for row in rows), dtype=np.float32).reshape(-1, dim)
+
+def _owner_index(owner_id: str) -> _OwnerIndex:
+    with _indexes_lock:
+        entry = _indexes.get(owner_id)
+        if entry is None:
+            entry = _indexes[owner_id] = _OwnerIndex()
+        _indexes.move_to_end(owner_id)
+        while len(_indexes) > RETRIEVAL_CACHE_OWNERS:
+            _indexes.popitem(last=False)
+        return entry
+
+def get_index(owner_id: str) -> VectorIndex:
+    """Return the owner's index, loading or topping it up from the database if it is behind."""
+    dim = embeddings.get_embedder().dim
+    entry = _owner_index(owner_id)
+    # Only loads of the same owner wait on each other; queries keep using the
+    # current index while it is topped up
+    with entry.lock:
+        count, newest = store.get_owner_chunk_state(owner_id)
+        index = entry.index
+        if index is not None and index.size == count and entry.newest == newest:
+            metrics.CACHE_HITS.labels("vector_index").inc()
+            return index
+        metrics.CACHE_MISSES.labels("vector_index").inc()
+
+        with metrics.STAGE_SECONDS.labels("vector_index_load").time():
+            if index is not None and index.size <= count:
+                entry.load(store.get_owner_chunk_embeddings(owner_id, since=entry.newest), dim, rebuild=False)
+            if entry.index is None or entry.index.size != count:
+                # New owner, or chunks were deleted (or committed behind the
+                # high-water mark): rebuild from scratch
+                entry.load(store.get_owner_chunk_embeddings(owner_id), dim, rebuild=True)
+        return entry.index
+
+@tracing.traced("retrieval.index_chapter")
+def index_chapter(chapter_id: str, book_id: str, owner_id: Optional[str], text: str) -> int:
+    """Chunk, embed and store a chapter's text. Returns the number of chunks stored."""
+    chunks = embeddings.chunk_text(text)
+    if not chunks:
+        return 0
+    with metrics.STAGE_SECONDS.labels("embedding").time():
+        vectors = embeddings.embed_texts(chunks)
+    store.create_chunks([
+        {
+            "id": f"{chapter_id}_chunk_{i}",
+            "chapter_id": chapter_id,
+            "book_id": book_id,
+            "owner_id": owner_id,
+            "chunk_index": i,
+            "text": chunk,
+            "embedding": vectors[i].tobytes()
+        }
+        for i, chunk in enumerate(chunks)
+    ])
+    return len(chunks)
+
+def index_chapter_async(chapter_id: str, book_id: str, owner_id: Optional[str]) -> Future:
+    """
+    Queue index_chapter on the indexing worker so embedding overlaps with LLM calls.
+    The chapter text is read from the store when the job runs, so queued jobs hold no text.
+    """
+    context = tracing.current_context()
+
+    def run():
+        with tracing.attached(context):
+            try:
+                return index_chapter(chapter_id, book_id, owner_id, store.get_chapter_text(chapter_id) or "")
+            except Exception as e:
+                metrics.ERRORS.labels("embedding").inc()
+                tracing.record_error(e)
+                logger.error("Error indexing chapter %s: %s", chapter_id, e)
+                return 0
+
+    return _indexer.submit(run)
+
+@tracing.traced("retrieval.retrieve")
+def retrieve(owner_id: str, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    """Return the owner's k chunks most similar to the query, best first."""
+    index = get_index(owner_id)
+    with metrics.STAGE_SECONDS.labels("retrieval").time():
+        query_vector = embeddings.embed_texts([query])[0]
+        hits = index.search(query_vector, k)
+    chunks = store.get_chunks([chunk_id for chunk_id, _ in hits])
+    return [
+        dict(chunks[chunk_id], score=score)
+        for chunk_id, score in hits
+        if chunk_id in chunks
+    ]
@@ -0,0 +1,108 @@
+"""
+Fair chapter scheduler for batch uploads.
+
+Every book is a group with a FIFO of tasks (one per chapter). SCHEDULER_WORKERS
+threads take one task at a time from the books in round-robin order, so a book
+with hundreds of chapters shares the workers with the small books queued after
+it instead of holding them until it finishes. Once all of a book's tasks have
+run, its on_done callback runs on the worker that finished the last one.
+"""
+import os
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))
+
+class _Group:
+    __slots__ = ("key", "tasks", "running", "on_done")
+
+    def __init__(self, key: str, tasks: List[Callable[[], None]], on_done: Callable[[], None]):
+        self.key = key
+        self.tasks: Deque[Callable[[], None]] = deque(tasks)
+        self.running = 0
+        self.on_done = on_done
+
+class FairScheduler:
+    def __init__(self, workers: int = SCHEDULER_WORKERS):
+        self.workers = workers
+        self._ready: Deque[_Group] = deque()
+        self._groups: Dict[str, _Group] = {}
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, key: str, tasks: List[Callable[[], None]], on_done: Callable[[], None]):
+        """Queue a group's tasks (run in order, one at a time per turn) and its completion callback."""
+        group = _Group(key, tasks, on_done)
+        with self._cond:
+            if key in self._groups:
+                raise ValueError(f"Group {key} is already scheduled")
+            self._groups[key] = group
+            self._start_workers()
+            if group.tasks:
+                self._ready.append(group)
+                metrics.SCHEDULED_CHAPTERS.inc(len(group.tasks))
+                self._cond.notify(len(group.tasks))
+        if not group.tasks:
+            self._finish(group)
+
+    def pending(self, key: str) -> int:
+        """Tasks of a group not yet started (0 once it is done)."""
+        with self._cond:
+            group = self._groups.get(key)
+            return len(group.tasks) if group else 0
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"scheduler-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._ready:
+                    self._cond.wait()
+                group = self._ready.popleft()
+                task = group.tasks.popleft()
+                group.running += 1
+                # Back of the line: every other book with work gets a turn first
+                if group.tasks:
+                    self._ready.append(group)
+            metrics.SCHEDULED_CHAPTERS.dec()
+
+            try:
+                task()
+            except Exception as e:
+                logger.exception("Scheduled task for %s failed: %s", group.key, e)
+
+            with self._cond:
+                group.running -= 1
+                done = not group.tasks and group.running == 0
+            if done:
+                self._finish(group)
+
+    def _finish(self, group: _Group):
+        try:
+            group.on_done()
+        except Exception as e:
+            logger.exception("Completion callback for %s failed: %s", group.key, e)
+        finally:
+            with self._cond:
+                self._groups.pop(group.key, None)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> FairScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FairScheduler()
+    return _scheduler
@@ -0,0 +1,194 @@
+"""
+Full-text search over chapter titles, text, summaries and key points.
+
+The index lives in the database and is kept current by the database itself,
+so every chapter written or updated by the pipeline is searchable right away:
+
+- PostgreSQL: a stored generated `search_vector` tsvector column on chapters
+  (title and summary/key points weighted above the body text) with a GIN
+  index, ranked with ts_rank_cd on the stored vector.
+- SQLite: an external-content FTS5 table over chapters maintained by
+  triggers, ranked with bm25(). It references chapters by rowid, so run
+  rebuild_search_index() after a VACUUM.
+
+On both, at most SEARCH_CANDIDATE_LIMIT matches (the owner's newest) are
+scored and snippets are only built for the rows of the requested page.
+"""
+import os
+import re
+import uuid
+import logging
+from typing import Any, Dict, List
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Engine
+from services.database import SessionLocal
+from services.models import Chapter
+from services import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+# At most this many matches are ranked per query. Selective queries match fewer
+# chapters and are ranked exactly; very broad ones (terms found in most of the
+# library) are ranked within this candidate set, which keeps their latency flat
+SEARCH_CANDIDATE_LIMIT = int(os.getenv("SEARCH_CANDIDATE_LIMIT", "500"))
+
+# Only the first part of very long chapters is indexed on PostgreSQL, which keeps
+# each tsvector well below its 1 MB limit
+PG_MAX_INDEXED_CHARS = 500000
+
+PG_SEARCH_VECTOR = f"""
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(summary, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(key_points::text, '')), 'B') ||
+    setweight(to_tsvector('english', left(coalesce(text, ''), {PG_MAX_INDEXED_CHARS})), 'D')
+"""
+
+PG_DDL = [
+    f"ALTER TABLE chapters ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({PG_SEARCH_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_chapters_search_vector ON chapters USING GIN (search_vector)",
+    # Serves the owner filter and the newest-first candidate order
+    "CREATE INDEX IF NOT EXISTS ix_chapters_owner_created ON chapters (owner_id, created_at DESC, id)",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chapters_fts USING fts5("
+    "title, summary, key_points, text, content='chapters', content_rowid='rowid', "
+    "tokenize='porter unicode61')",
+    """CREATE TRIGGER IF NOT EXISTS chapters_fts_insert AFTER INSERT ON chapters BEGIN
+        INSERT INTO chapters_fts(rowid, title, summary, key_points, text)
+        VALUES (new.rowid, new.title, new.summary, new.key_points, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chapters_fts_delete AFTER DELETE ON chapters BEGIN
+        INSERT INTO chapters_fts(chapters_fts, rowid, title, summary, key_points, text)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.key_points, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chapters_fts_update AFTER UPDATE ON chapters BEGIN
+        INSERT INTO chapters_fts(chapters_fts, rowid, title, summary, key_points, text)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.key_points, old.text);
+        INSERT INTO chapters_fts(rowid, title, summary, key_points, text)
+        VALUES (new.rowid, new.title, new.summary, new.key_points, new.text);
+    END""",
+]
+
+PG_SEARCH = text(f"""
+    WITH query AS (SELECT websearch_to_tsquery('english', :query) AS q),
+    candidates AS (
+        SELECT c.id, ts_rank_cd(c.search_vector, query.q) AS rank
+        FROM chapters c, query
+        WHERE c.owner_id = :owner_id AND c.search_vector @@ query.q
+        ORDER BY c.created_at DESC, c.id
+        LIMIT :candidates
+    ),
+    page AS (
+        SELECT id, rank FROM candidates
+        ORDER BY rank DESC, id
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT c.book_id, b.title AS book_title, c.chapter_index, c.title, page.rank,
+           ts_headline('english', coalesce(c.summary, '') || ' ' || left(c.text, {PG_MAX_INDEXED_CHARS}), query.q,
+                       'MaxFragments=1, MinWords=10, MaxWords=30, StartSel=<b>, StopSel=</b>') AS snippet
+    FROM page
+    JOIN chapters c ON c.id = page.id
+    JOIN books b ON b.id = c.book_id, query
+    ORDER BY page.rank DESC, c.id
+""").bindparams(bindparam("owner_id", type_=Chapter.__table__.c.owner_id.type))
+
+# Candidates are the newest matches (FTS5 streams rowids in descending order);
+# snippet() runs in a second MATCH restricted to the page's rowids
+SQLITE_SEARCH = text("""
+    WITH candidates AS (
+        SELECT chapters_fts.rowid AS chapter_rowid, bm25(chapters_fts, 10.0, 4.0, 4.0, 1.0) AS score
+        FROM chapters_fts
+        JOIN chapters c ON c.rowid = chapters_fts.rowid
+        WHERE chapters_fts MATCH :query AND c.owner_id = :owner_id
+        ORDER BY chapters_fts.rowid DESC
+        LIMIT :candidates
+    ),
+    page AS (
+        SELECT chapter_rowid, score FROM candidates
+        ORDER BY score, chapter_rowid DESC
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT c.book_id, b.title AS book_title, c.chapter_index, c.title, -page.score AS rank,
+           snippet(chapters_fts, -1, '<b>', '</b>', '…', 24) AS snippet
+    FROM page
+    JOIN chapters_fts ON chapters_fts.rowid = page.chapter_rowid
+    JOIN chapters c ON c.rowid = page.chapter_rowid
+    JOIN books b ON b.id = c.book_id
+    WHERE chapters_fts MATCH :query
+    ORDER BY page.score, page.chapter_rowid DESC
+""").bindparams(bindparam("owner_id", type_=Chapter.__table__.c.owner_id.type))
+
+def init_search_index(engine: Engine):
+    """Create the search index for the engine's dialect (idempotent)."""
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        statements = PG_DDL
+    elif dialect == "sqlite":
+        statements = SQLITE_DDL
+    else:
+        logger.warning("Full-text search is not supported on %s", dialect)
+        return
+
+    created = dialect == "sqlite" and not inspect(engine).has_table("chapters_fts")
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+    if created:
+        # Index chapters written before the FTS table existed
+        rebuild_search_index(engine)
+
+def rebuild_search_index(engine: Engine):
+    """Re-index every chapter (SQLite only; PostgreSQL keeps the generated column current)."""
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO chapters_fts(chapters_fts) VALUES ('rebuild')"))
+
+def _fts5_query(query: str) -> str:
+    # Quote every word so user input can never be parsed as FTS5 syntax; terms are ANDed
+    words = dict.fromkeys(word.lower() for word in re.findall(r"\w+", query))
+    return " ".join(f'"{word}"' for word in words)
+
+@tracing.traced("search.search_chapters")
+def search_chapters(owner_id: str, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """
+    Search an owner's chapters. Returns {results: [...], has_more: bool} where each
+    result has book_id, book_title, chapter_index, title, rank and snippet, best first.
+    """
+    db = SessionLocal()
+    try:
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            statement, query_param = PG_SEARCH, query
+        elif dialect == "sqlite":
+            statement, query_param = SQLITE_SEARCH, _fts5_query(query)
+        else:
+            raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+        if not query_param.strip():
+            return {"results": [], "has_more": False}
+
+        # Fetch one extra row to know whether another page exists
+        with metrics.STAGE_SECONDS.labels("search").time():
+            rows = db.execute(statement, {
+                "query": query_param,
+                "owner_id": uuid.UUID(str(owner_id)),
+                "limit": limit + 1,
+                "offset": offset,
+                "candidates": SEARCH_CANDIDATE_LIMIT
+            }).mappings().all()
+        results: List[Dict[str, Any]] = [
+            {
+                "book_id": row["book_id"],
+                "book_title": row["book_title"],
+                "chapter_index": row["chapter_index"],
+                "title": row["title"],
+                "rank": float(row["rank"]),
+                "snippet": row["snippet"]
+            }
+            for row in rows[:limit]
+        ]
+        return {"results": results, "has_more": len(rows) > limit}
+    finally:
+        db.close()
@@ -0,0 +1,38 @@
+"""
+Single-flight call deduplication.
+
+While a call for a key is running, further callers with the same key wait for
+it and share its result (or exception) instead of making the call again. Once
+it returns the key is released, so a later call runs afresh; callers that need
+the result only once must check for it inside fn. Deduplication is per process.
+"""
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn unless a call for key is in flight; returns (result, shared)."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -1,8 +1,12 @@
-from sqlalchemy.orm import Session
-from services.models import Book, Chapter
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session, defer
+from services.models import Batch, Book, Chapter, ChapterChunk
 from services.database import SessionLocal
-from typing import List, Optional, Dict, Any
+from services import metrics, tracing
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime
 import json
+import uuid
 
 """
 
@@ -18,6 +22,7 @@ def get_db():
 
 # --- Book Operations ---
 
+@tracing.traced("store.create_book")
 def create_book(book_data: Dict[str, Any]) -> Book:
     db = SessionLocal()
     try:
@@ -28,14 +33,17 @@ def create_book(book_data: Dict[str, Any]) -> Book:
             id=book_data.get("id"),
             title=book_data.get("title"),
             status=book_data.get("status", "processing"),
-            owner_id=book_data.get("owner_id"),
+            owner_id=_to_uuid(book_data.get("owner_id")),
             chapter_count=book_data.get("chapter_count", 0),
+            batch_id=book_data.get("batch_id"),
+            reserved_tokens=book_data.get("reserved_tokens", 0),
             overview_summary=book_data.get("overview_summary"),
             overview_key_points=book_data.get("overview_key_points"),
             overview_questions=book_data.get("overview_questions")
         )
-        db.add(new_book)
-        db.commit()
+        with metrics.DB_WRITE_SECONDS.labels("create_book").time():
+            db.add(new_book)
+            db.commit()
         db.refresh(new_book)
         return new_book
     finally:
@@ -66,6 +74,7 @@ def get_all_books() -> Dict[str, Any]:
     finally:
         db.close()
 
+@tracing.traced("store.update_book")
 def update_book(book_id: str, data: Dict[str, Any]):
     db = SessionLocal()
     try:
@@ -74,48 +83,203 @@ def update_book(book_id: str, data: Dict[str, Any]):
             for key, value in data.items():
                 if hasattr(book, key):
                     setattr(book, key, value)
-            db.commit()
+            # A finished book's usage is recorded; it no longer holds a reservation
+            if data.get("status") in ("completed", "error"):
+                book.reserved_tokens = 0
+            with metrics.DB_WRITE_SECONDS.labels("update_book").time():
+                db.commit()
             db.refresh(book)
             return _book_to_dict(book)
         return None
     finally:
         db.close()
 
+@tracing.traced("store.delete_book")
 def delete_book(book_id: str):
     db = SessionLocal()
     try:
         book = db.query(Book).filter(Book.id == book_id).first()
         if book:
-            db.delete(book)
-            db.commit()
+            with metrics.DB_WRITE_SECONDS.labels("delete_book").time():
+                db.delete(book)
+                db.commit()
             return True
         return False
     finally:
         db.close()
 
+# --- Batch Operations ---
+
+@tracing.traced("store.create_batch")
+def create_batch(batch_data: Dict[str, Any]) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        new_batch = Batch(
+            id=batch_data.get("id"),
+            owner_id=_to_uuid(batch_data.get("owner_id")),
+            book_count=batch_data.get("book_count", 0)
+        )
+        with metrics.DB_WRITE_SECONDS.labels("create_batch").time():
+            db.add(new_batch)
+            db.commit()
+        db.refresh(new_batch)
+        return _batch_to_dict(new_batch)
+    finally:
+        db.close()
+
+def get_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Return a batch with its books, each with the number of chapters analyzed so far."""
+    db = SessionLocal()
+    try:
+        batch = db.query(Batch).filter(Batch.id == batch_id).first()
+        if not batch:
+            return None
+        analyzed = (
+            db.query(Chapter.book_id, func.count(Chapter.id))
+            .join(Book, Book.id == Chapter.book_id)
+            .filter(Book.batch_id == batch_id, Chapter.summary.isnot(None))
+            .group_by(Chapter.book_id)
+            .all()
+        )
+        analyzed = dict(analyzed)
+        books = (
+            db.query(Book.id, Book.title, Book.status, Book.chapter_count)
+            .filter(Book.batch_id == batch_id)
+            .order_by(Book.created_at, Book.title)
+            .all()
+        )
+        result = _batch_to_dict(batch)
+        result["books"] = [
+            {
+                "id": book.id,
+                "title": book.title,
+                "status": book.status,
+                "chapter_count": book.chapter_count or 0,
+                "analyzed_chapters": analyzed.get(book.id, 0)
+            }
+            for book in books
+        ]
+        return result
+    finally:
+        db.close()
+
 # --- Chapter Operations ---
 
+@tracing.traced("store.create_chapter")
 def create_chapter(chapter_data: Dict[str, Any]):
     db = SessionLocal()
     try:
         new_chapter = Chapter(
             id=chapter_data.get("id"),
             book_id=chapter_data.get("book_id"),
-            owner_id=chapter_data.get("owner_id"),
+            owner_id=_to_uuid(chapter_data.get("owner_id")),
             chapter_index=chapter_data.get("chapter_index"),
             title=chapter_data.get("title"),
             text=chapter_data.get("text"),
             summary=chapter_data.get("summary"),
             key_points=chapter_data.get("key_points"),
-            questions=chapter_data.get("questions")
+            questions=chapter_data.get("questions"),
+            prompt_tokens=chapter_data.get("prompt_tokens", 0),
+            completion_tokens=chapter_data.get("completion_tokens", 0),
+            llm_latency_ms=chapter_data.get("llm_latency_ms")
         )
-        db.add(new_chapter)
-        db.commit()
+        with metrics.DB_WRITE_SECONDS.labels("create_chapter").time():
+            db.add(new_chapter)
+            db.commit()
         db.refresh(new_chapter)
         return _chapter_to_dict(new_chapter)
     finally:
         db.close()
 
+@tracing.traced("store.create_chapters")
+def create_chapters(book_id: str, owner_id: Optional[str], chapters_data: List[Dict[str, Any]]):
+    """Insert a book's parsed chapters ({index, title, text}) before analysis, in one statement."""
+    db = SessionLocal()
+    try:
+        owner_uuid = _to_uuid(owner_id)
+        rows = [
+            {
+                "id": f"{book_id}_chapter_{chapter['index']}",
+                "book_id": book_id,
+                "owner_id": owner_uuid,
+                "chapter_index": chapter["index"],
+                "title": chapter["title"],
+                "text": chapter["text"]
+            }
+            for chapter in chapters_data
+        ]
+        with metrics.DB_WRITE_SECONDS.labels("create_chapters").time():
+            db.execute(Chapter.__table__.insert(), rows)
+            db.commit()
+    finally:
+        db.close()
+
+def get_book_chapter_refs(book_id: str) -> List[Any]:
+    """Return (id, chapter_index, title) rows of a book's chapters, without their text."""
+    db = SessionLocal()
+    try:
+        return (
+            db.query(Chapter.id, Chapter.chapter_index, Chapter.title)
+            .filter(Chapter.book_id == book_id)
+            .order_by(Chapter.chapter_index)
+            .all()
+        )
+    finally:
+        db.close()
+
+def get_chapter_text(chapter_id: str) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        return db.query(Chapter.text).filter(Chapter.id == chapter_id).scalar()
+    finally:
+        db.close()
+
+def get_book_text_chars(book_id: str) -> int:
+    """Total length of a book's chapter text, counted in the database."""
+    db = SessionLocal()
+    try:
+        return db.query(func.coalesce(func.sum(func.length(Chapter.text)), 0)).filter(Chapter.book_id == book_id).scalar()
+    finally:
+        db.close()
+
+def iter_book_chapter_digests(book_id: str, excerpt_chars: int):
+    """Yield (title, digest) in reading order: the summary, or the first excerpt_chars of an unanalyzed chapter."""
+    db = SessionLocal()
+    try:
+        digest = func.coalesce(Chapter.summary, func.substr(Chapter.text, 1, excerpt_chars))
+        query = db.query(Chapter.title, digest).filter(Chapter.book_id == book_id).order_by(Chapter.chapter_index)
+        for row in query.yield_per(64):
+            yield tuple(row)
+    finally:
+        db.close()
+
+def iter_book_chapter_fields(book_id: str, *fields: str):
+    """Yield tuples of the given Chapter columns in reading order, fetched in batches."""
+    db = SessionLocal()
+    try:
+        columns = [getattr(Chapter, field) for field in fields]
+        query = db.query(*columns).filter(Chapter.book_id == book_id).order_by(Chapter.chapter_index)
+        for row in query.yield_per(64):
+            yield tuple(row)
+    finally:
+        db.close()
+
+@tracing.traced("store.save_chapter_analysis")
+def save_chapter_analysis(chapter_id: str, data: Dict[str, Any], book_id: Optional[str] = None):
+    """
+    Write analysis fields to a stored chapter without loading it (or its text) first.
+    With book_id, the chapter's token usage is added to the book's totals in the same commit.
+    """
+    db = SessionLocal()
+    try:
+        with metrics.DB_WRITE_SECONDS.labels("save_chapter_analysis").time():
+            db.execute(Chapter.__table__.update().where(Chapter.__table__.c.id == chapter_id).values(**data))
+            if book_id is not None:
+                db.execute(_add_book_usage(book_id, data.get("prompt_tokens", 0), data.get("completion_tokens", 0)))
+            db.commit()
+    finally:
+        db.close()
+
 def get_chapter(chapter_id: str) -> Optional[Dict[str, Any]]:
     db = SessionLocal()
     try:
@@ -127,13 +291,18 @@ def get_chapter(chapter_id: str) -> Optional[Dict[str, Any]]:
         db.close()
 
 def get_book_chapters(book_id: str) -> List[Dict[str, Any]]:
+    """A book's chapters without their text (not loaded from the database either)."""
     db = SessionLocal()
     try:
-        chapters = db.query(Chapter).filter(Chapter.book_id == book_id).order_by(Chapter.chapter_index).all()
-        return [_chapter_to_dict(ch) for ch in chapters]
+        chapters = (
+            db.query(Chapter).options(defer(Chapter.text))
+            .filter(Chapter.book_id == book_id).order_by(Chapter.chapter_index).all()
+        )
+        return [_chapter_to_dict(ch, include_text=False) for ch in chapters]
     finally:
         db.close()
 
+@tracing.traced("store.update_chapter")
 def update_chapter(chapter_id: str, data: Dict[str, Any]):
     db = SessionLocal()
     try:
@@ -142,15 +311,169 @@ def update_chapter(chapter_id: str, data: Dict[str, Any]):
             for key, value in data.items():
                 if hasattr(chapter, key):
                     setattr(chapter, key, value)
-            db.commit()
+            with metrics.DB_WRITE_SECONDS.labels("update_chapter").time():
+                db.commit()
             db.refresh(chapter)
             return _chapter_to_dict(chapter)
         return None
     finally:
         db.close()
 
+# --- Chunk Operations ---
+
+@tracing.traced("store.create_chunks")
+def create_chunks(chunks_data: List[Dict[str, Any]]):
+    db = SessionLocal()
+    try:
+        rows = [dict(chunk, owner_id=_to_uuid(chunk.get("owner_id"))) for chunk in chunks_data]
+        with metrics.DB_WRITE_SECONDS.labels("create_chunks").time():
+            db.execute(ChapterChunk.__table__.insert(), rows)
+            db.commit()
+    finally:
+        db.close()
+
+def get_owner_chunk_state(owner_id: str) -> Tuple[int, Any]:
+    """Return the number of the owner's chunks and the newest chunk's created_at."""
+    db = SessionLocal()
+    try:
+        return tuple(
+            db.query(func.count(ChapterChunk.id), func.max(ChapterChunk.created_at))
+            .filter(ChapterChunk.owner_id == _to_uuid(owner_id))
+            .one()
+        )
+    finally:
+        db.close()
+
+def get_owner_chunk_embeddings(owner_id: str, since: Any = None) -> List[Any]:
+    """
+    Return (chunk id, embedding bytes, created_at) rows for the owner's chunks,
+    oldest first; with since, only chunks created at or after it.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(ChapterChunk.id, ChapterChunk.embedding, ChapterChunk.created_at).filter(
+            ChapterChunk.owner_id == _to_uuid(owner_id)
+        )
+        if since is not None:
+            query = query.filter(ChapterChunk.created_at >= since)
+        return query.order_by(ChapterChunk.created_at, ChapterChunk.id).all()
+    finally:
+        db.close()
+
+def get_chunks(chunk_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Return chunk text and chapter/book info keyed by chunk id."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(ChapterChunk.id, ChapterChunk.book_id, ChapterChunk.chunk_index, ChapterChunk.text,
+                     Chapter.chapter_index, Chapter.title, Book.title.label("book_title"))
+            .join(Chapter, Chapter.id == ChapterChunk.chapter_id)
+            .join(Book, Book.id == ChapterChunk.book_id)
+            .filter(ChapterChunk.id.in_(chunk_ids))
+            .all()
+        )
+        return {
+            row.id: {
+                "book_id": row.book_id,
+                "book_title": row.book_title,
+                "chapter_index": row.chapter_index,
+                "chapter_title": row.title,
+                "chunk_index": row.chunk_index,
+                "text": row.text
+            }
+            for row in rows
+        }
+    finally:
+        db.close()
+
+# --- Usage Operations ---
+
+def get_book_usage(book_id: str) -> Optional[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        book = db.query(Book).filter(Book.id == book_id).first()
+        if not book:
+            return None
+        chapters = (
+            db.query(Chapter.chapter_index, Chapter.prompt_tokens, Chapter.completion_tokens, Chapter.llm_latency_ms)
+            .filter(Chapter.book_id == book_id)
+            .order_by(Chapter.chapter_index)
+            .all()
+        )
+        return {
+            "book_id": book.id,
+            "prompt_tokens": book.prompt_tokens or 0,
+            "completion_tokens": book.completion_tokens or 0,
+            "total_tokens": (book.prompt_tokens or 0) + (book.completion_tokens or 0),
+            "chapters": [
+                {
+                    "chapter_index": ch.chapter_index,
+                    "prompt_tokens": ch.prompt_tokens or 0,
+                    "completion_tokens": ch.completion_tokens or 0,
+                    "latency_ms": ch.llm_latency_ms
+                }
+                for ch in chapters
+            ]
+        }
+    finally:
+        db.close()
+
+@tracing.traced("store.add_book_usage")
+def add_book_usage(book_id: str, prompt_tokens: int, completion_tokens: int):
+    db = SessionLocal()
+    try:
+        with metrics.DB_WRITE_SECONDS.labels("add_book_usage").time():
+            db.execute(_add_book_usage(book_id, prompt_tokens, completion_tokens))
+            db.commit()
+    finally:
+        db.close()
+
+def get_owner_usage(owner_id: str, since: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Sum token usage over an owner's books, optionally only books created at or after `since`.
+    reserved_tokens is the part of in-progress books' reservations not used yet.
+    """
+    db = SessionLocal()
+    try:
+        used = func.coalesce(Book.prompt_tokens, 0) + func.coalesce(Book.completion_tokens, 0)
+        reserved = func.coalesce(Book.reserved_tokens, 0)
+        query = db.query(
+            func.count(Book.id),
+            func.coalesce(func.sum(Book.prompt_tokens), 0),
+            func.coalesce(func.sum(Book.completion_tokens), 0),
+            func.coalesce(func.sum(case((reserved > used, reserved - used), else_=0)), 0)
+        ).filter(Book.owner_id == _to_uuid(owner_id))
+        if since is not None:
+            query = query.filter(Book.created_at >= since)
+        book_count, prompt_tokens, completion_tokens, reserved_tokens = query.one()
+        return {
+            "owner_id": str(owner_id),
+            "book_count": book_count,
+            "prompt_tokens": int(prompt_tokens),
+            "completion_tokens": int(completion_tokens),
+            "total_tokens": int(prompt_tokens) + int(completion_tokens),
+            "reserved_tokens": int(reserved_tokens)
+        }
+    finally:
+        db.close()
+
 # --- Helpers ---
 
+def _to_uuid(value) -> Optional[uuid.UUID]:
+    # owner_id arrives as the JWT "sub" string; the UUID column type needs a UUID
+    # object on backends without a native uuid type (e.g. the SQLite fallback)
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    return uuid.UUID(str(value))
+
+def _add_book_usage(book_id: str, prompt_tokens: int, completion_tokens: int):
+    # Increment in SQL: chapters analyzed on demand add to a book concurrently
+    books = Book.__table__
+    return books.update().where(books.c.id == book_id).values(
+        prompt_tokens=func.coalesce(books.c.prompt_tokens, 0) + prompt_tokens,
+        completion_tokens=func.coalesce(books.c.completion_tokens, 0) + completion_tokens
+    )
+
 def _book_to_dict(book: Book) -> Dict[str, Any]:
     return {
         "id": book.id,
@@ -164,18 +487,28 @@ def _book_to_dict(book: Book) -> Dict[str, Any]:
         "created_at": book.created_at.isoformat() if book.created_at else None
     }
 
-def _chapter_to_dict(chapter: Chapter) -> Dict[str, Any]:
+def _batch_to_dict(batch: Batch) -> Dict[str, Any]:
     return {
+        "id": batch.id,
+        "owner_id": str(batch.owner_id) if batch.owner_id else None,
+        "book_count": batch.book_count,
+        "created_at": batch.created_at.isoformat() if batch.created_at else None
+    }
+
+def _chapter_to_dict(chapter: Chapter, include_text: bool = True) -> Dict[str, Any]:
+    data = {
         "id": chapter.id,
         "book_id": chapter.book_id,
         "owner_id": str(chapter.owner_id) if chapter.owner_id else None,
         "chapter_index": chapter.chapter_index,
         "title": chapter.title,
-        "text": chapter.text,
         "summary": chapter.summary,
         "key_points": chapter.key_points,
         "questions": chapter.questions
     }
+    if include_text:
+        data["text"] = chapter.text
+    return data
 
 # Compatibility layers for direct dict access if needed, 
 # but we should refactor main.py to use functions instead of accessing these directly.
@@ -0,0 +1,129 @@
+"""
+OpenTelemetry tracing for the upload pipeline.
+
+An upload produces one trace: upload_book -> parser.parse_book_to_chapters,
+store.create_book, store.create_chapters, and process_book_background ->
+ai.process_chapter / store.save_chapter_analysis / retrieval.index_chapter per
+chapter -> ai.process_book_overview -> store.update_book.
+The background task runs after the response is sent, so the handler captures
+its context with current_context() and the task re-enters it with attached().
+
+OTEL_TRACES_EXPORTER selects the exporter:
+    none (default)  tracing calls are no-ops
+    console         print spans to stdout
+    otlp            OTLP/HTTP, endpoint from OTEL_EXPORTER_OTLP_ENDPOINT
+                    (default http://localhost:4318)
+    file            JSON lines appended to OTEL_TRACES_FILE (default traces.jsonl)
+"""
+import os
+import asyncio
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from opentelemetry import trace, context as otel_context
+from opentelemetry.trace import Status, StatusCode
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor, SpanExporter, SpanExportResult
+)
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("readwise")
+
+_configured = False
+
+def configure_tracing():
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    exporter_name = os.getenv("OTEL_TRACES_EXPORTER", "none").lower()
+    if exporter_name == "none":
+        return
+
+    provider = TracerProvider(resource=Resource.create({
+        "service.name": os.getenv("OTEL_SERVICE_NAME", "readwise-api")
+    }))
+    if exporter_name == "console":
+        provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+    elif exporter_name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    elif exporter_name == "file":
+        path = os.getenv("OTEL_TRACES_FILE", "traces.jsonl")
+        provider.add_span_processor(SimpleSpanProcessor(FileSpanExporter(path)))
+    else:
+        logger.warning("Unknown OTEL_TRACES_EXPORTER '%s', tracing disabled", exporter_name)
+        return
+    trace.set_tracer_provider(provider)
+
+def shutdown_tracing():
+    """Flush buffered spans (e.g. the OTLP batch processor) before exit."""
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.shutdown()
+
+class FileSpanExporter(SpanExporter):
+    """Append finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = [span.to_json(indent=None) + "\n" for span in spans]
+        with self._lock, open(self.path, "a") as f:
+            f.writelines(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+def current_context():
+    """Capture the active trace context so background work can continue the trace."""
+    return otel_context.get_current()
+
+@contextmanager
+def attached(ctx):
+    """Make a context captured with current_context() active for the block."""
+    if ctx is None:
+        yield
+        return
+    token = otel_context.attach(ctx)
+    try:
+        yield
+    finally:
+        otel_context.detach(token)
+
+def record_error(error: Exception):
+    """Mark the current span as failed for errors that are handled rather than raised."""
+    span = trace.get_current_span()
+    span.record_exception(error)
+    span.set_status(Status(StatusCode.ERROR, str(error)))
+
+def set_attributes(attributes: dict):
+    span = trace.get_current_span()
+    for key, value in attributes.items():
+        if value is not None:
+            span.set_attribute(key, value)
+
+def traced(name: str):
+    """Run the decorated function (sync or async) inside a span called `name`."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.start_as_current_span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from services.scheduler import FairScheduler
+
+TIMEOUT = 5
+
+def _recorder(order, lock, name):
+    def task():
+        with lock:
+            order.append(name)
+    return task
+
+def test_round_robin_between_groups():
+    scheduler = FairScheduler(workers=1)
+    order, lock = [], threading.Lock()
+    gate, done_a, done_b = threading.Event(), threading.Event(), threading.Event()
+
+    # Hold the only worker so both groups are queued before either runs
+    scheduler.submit("gate", [lambda: gate.wait(TIMEOUT)], lambda: None)
+    scheduler.submit("a", [_recorder(order, lock, f"a{i}") for i in range(3)], done_a.set)
+    scheduler.submit("b", [_recorder(order, lock, f"b{i}") for i in range(2)], done_b.set)
+    assert scheduler.pending("a") == 3
+    gate.set()
+
+    assert done_a.wait(TIMEOUT) and done_b.wait(TIMEOUT)
+    assert order == ["a0", "b0", "a1", "b1", "a2"]
+    assert scheduler.pending("a") == 0
+
+def test_on_done_runs_once_after_all_tasks():
+    scheduler = FairScheduler(workers=3)
+    finished, lock = [], threading.Lock()
+    calls = []
+    done = threading.Event()
+
+    def on_done():
+        calls.append(len(finished))
+        done.set()
+
+    scheduler.submit("book", [_recorder(finished, lock, i) for i in range(10)], on_done)
+    assert done.wait(TIMEOUT)
+    assert calls == [10]
+
+def test_failing_task_does_not_stop_group():
+    scheduler = FairScheduler(workers=1)
+    order, lock = [], threading.Lock()
+    done = threading.Event()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    scheduler.submit("book", [fail, _recorder(order, lock, "after")], done.set)
+    assert done.wait(TIMEOUT)
+    assert order == ["after"]
+
+def test_empty_group_finishes_immediately():
+    scheduler = FairScheduler(workers=1)
+    calls = []
+
+    scheduler.submit("empty", [], lambda: calls.append("done"))
+    assert calls == ["done"]
+    assert scheduler.pending("empty") == 0
+
+    # The key is released, so the book can be scheduled again
+    scheduler.submit("empty", [], lambda: calls.append("again"))
+    assert calls == ["done", "again"]
+
+def test_duplicate_key_is_rejected():
+    scheduler = FairScheduler(workers=1)
+    gate = threading.Event()
+    scheduler.submit("book", [lambda: gate.wait(TIMEOUT)], lambda: None)
+    try:
+        with pytest.raises(ValueError):
+            scheduler.submit("book", [lambda: None], lambda: None)
+    finally:
+        gate.set()